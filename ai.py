@@ -1,98 +1,1042 @@
 # ai.py
 
+import atexit
+import json
 import math
-import random
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+import settings
 from game import Move
+from bitboard import Position, EMPTY, move_from, move_to, move_promotion, piece_name
+from transposition import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from tablebase import Tablebases, decode_value
+import endgame
 
-def find_best_move(game, depth):
+# Оценка мата (больше любой материальной оценки)
+MATE_SCORE = 1000
+
+# Амплитуда случайного фактора оценки в пешках (меньше бонусов за положение фигур)
+EVAL_JITTER = 0.1
+
+# Предельная глубина итеративного углубления
+MAX_SEARCH_DEPTH = 64
+
+# Значения фигур для сортировки взятий MVV-LVA (король как атакующая фигура — самый дорогой)
+ORDERING_VALUES = (1, 3, 3, 5, 9, 10)
+
+# Приоритеты групп ходов при сортировке
+HASH_MOVE_PRIORITY = 1 << 30
+PROMOTION_PRIORITY = 1 << 29
+CAPTURE_PRIORITY = 1 << 28
+KILLER_PRIORITY = 1 << 27
+HISTORY_LIMIT = 1 << 26
+
+# Число учитываемых позиций хода в статистике отсечений (последняя ячейка — этот ход и все следующие)
+CUTOFF_INDEX_SLOTS = 8
+
+# Алгоритмы поиска: PVS (negamax с нулевыми окнами) и исходный минимакс с альфа-бета отсечением
+SEARCH_ALGORITHMS = ('pvs', 'minimax')
+
+# Глубина поиска, которым предсказывается ответ соперника для обдумывания, если его нет в таблице транспозиций
+PONDER_PREDICTION_DEPTH = 2
+
+# Полуширина окна аспирации вокруг оценки предыдущей итерации (в пешках)
+ASPIRATION_WINDOW = 0.25
+
+# Тип границы оценки с точки зрения черных для каждого типа границы с точки зрения белых
+FLIPPED_BOUNDS = {EXACT: EXACT, LOWER_BOUND: UPPER_BOUND, UPPER_BOUND: LOWER_BOUND}
+
+# Таблица транспозиций, общая для всех поисков (размер задается в settings.TT_SIZE_MB)
+transposition_table = TranspositionTable(settings.TT_SIZE_MB)
+
+# Эндшпильные таблицы из settings.TABLEBASE_DIR (файлы отображаются в память при первом обращении,
+# недостающие таблицы из settings.TABLEBASE_ON_DEMAND строятся в фоне)
+tablebases = Tablebases(on_demand=settings.TABLEBASE_ON_DEMAND)
+atexit.register(tablebases.close)
+
+# Пул процессов параллельного поиска (создается при первом обращении), общая для всех
+# процессов лучшая оценка корня и событие, прерывающее поиск в процессах
+executor = None
+executor_workers = 0
+shared_bound = None
+shared_stop = None
+
+# Статистика последнего вызова find_best_move (словарь, см. SearchContext.stats) или None
+last_search_stats = None
+
+class SearchTimeout(Exception):
+    """
+    Исключение, прерывающее поиск по истечении отведенного времени.
+    """
+    pass
+
+class SearchContext:
+    """
+    Состояние одного вызова поиска: алгоритм, ограничение по времени, флаг отмены, счетчики статистики,
+    ходы-убийцы и таблица истории для сортировки ходов.
     """
-    Находит лучший ход для текущего игрока (человека или ИИ) с использованием алгоритма минимакс.
+    def __init__(self, deadline=None, move_ordering=True, stop_event=None, algorithm=None):
+        """
+        :param deadline: Момент времени (time.perf_counter()), после которого поиск прерывается, или None.
+        :param move_ordering: Флаг, указывающий, нужно ли сортировать ходы (отключается для сравнения в бенчмарке).
+        :param stop_event: Событие threading.Event, установка которого прерывает поиск, или None.
+        :param algorithm: Алгоритм поиска из SEARCH_ALGORITHMS (по умолчанию settings.AI_SEARCH_ALGORITHM).
+        """
+        self.deadline = deadline
+        self.stop_event = stop_event
+        self.move_ordering = move_ordering
+        self.algorithm = algorithm or settings.AI_SEARCH_ALGORITHM
+        self.nodes = 0
+        self.leaf_evaluations = 0
+        self.tt_hits = 0
+        self.cutoffs = [0] * CUTOFF_INDEX_SLOTS  # Отсечения по номеру хода, вызвавшего отсечение
+        self.depth = 0  # Глубина последней завершенной итерации
+        self.killers = [[-1, -1] for _ in range(MAX_SEARCH_DEPTH + 1)]
+        self.history = [0] * 4096
+
+    def record_cutoff(self, position, move, depth, index):
+        """
+        Учитывает отсечение в статистике и запоминает тихий ход, вызвавший его,
+        в ходах-убийцах текущего ply и в таблице истории.
+        
+        :param position: Позиция до выполнения хода.
+        :param move: Закодированный ход.
+        :param depth: Оставшаяся глубина поиска.
+        :param index: Номер хода в порядке перебора (0 — первый).
+        """
+        self.cutoffs[min(index, CUTOFF_INDEX_SLOTS - 1)] += 1
+        if position.mailbox[move_to(move)] != EMPTY or move_promotion(move):
+            return  # Взятия и превращения и так сортируются первыми
+        killers = self.killers[min(len(position.history), MAX_SEARCH_DEPTH)]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        index = move & 4095
+        self.history[index] += depth * depth
+        if self.history[index] > HISTORY_LIMIT:
+            self.history = [value // 2 for value in self.history]
+
+    def counters(self):
+        """
+        Возвращает счетчики статистики для передачи из процесса пула.
+        
+        :return: Кортеж (узлы, оценки листьев, попадания в таблицу транспозиций, отсечения по номеру хода).
+        """
+        return self.nodes, self.leaf_evaluations, self.tt_hits, self.cutoffs
+
+    def add_counters(self, counters):
+        """
+        Прибавляет счетчики другого контекста (см. counters).
+        """
+        nodes, leaf_evaluations, tt_hits, cutoffs = counters
+        self.nodes += nodes
+        self.leaf_evaluations += leaf_evaluations
+        self.tt_hits += tt_hits
+        self.cutoffs = [a + b for a, b in zip(self.cutoffs, cutoffs)]
+
+    def stats(self, elapsed):
+        """
+        Собирает статистику поиска.
+        
+        :param elapsed: Время поиска в секундах.
+        :return: Словарь: узлы, оценки листьев, отсечения (всего, по номеру хода и доля на первом ходе),
+                 попадания в таблицу транспозиций, достигнутая глубина, время в мс и узлы в секунду.
+        """
+        beta_cutoffs = sum(self.cutoffs)
+        return {
+            'nodes': self.nodes,
+            'leaf_evaluations': self.leaf_evaluations,
+            'beta_cutoffs': beta_cutoffs,
+            'cutoffs_by_move_index': list(self.cutoffs),
+            'first_move_cutoff_rate': round(self.cutoffs[0] / beta_cutoffs, 4) if beta_cutoffs else None,
+            'tt_hits': self.tt_hits,
+            'depth': self.depth,
+            'time_ms': round(elapsed * 1000, 3),
+            'nps': round(self.nodes / elapsed) if elapsed > 0 else None,
+        }
+
+    def check_limits(self):
+        """
+        Прерывает поиск исключением SearchTimeout, если время истекло или поиск отменен.
+        """
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchTimeout()
+
+def find_best_move(game, depth=None, time_limit_ms=None, stop_event=None):
+    """
+    Находит лучший ход для текущего игрока (человека или ИИ) алгоритмом settings.AI_SEARCH_ALGORITHM
+    (PVS или минимакс с альфа-бета отсечением).
+    
+    Поиск ведется на битбордовой копии позиции (bitboard.Position), сам объект игры не изменяется.
+    Если задан time_limit_ms, используется итеративное углубление: глубина увеличивается, пока
+    не истечет время, и возвращается лучший ход последней полностью завершенной итерации.
+    Статистика поиска сохраняется в last_search_stats и, если задан settings.AI_STATS_FILE,
+    дописывается в этот файл строкой JSON.
     
     :param game: Объект игры, содержащий текущее состояние доски.
-    :param depth: Глубина поиска для алгоритма минимакс.
+    :param depth: Глубина поиска для алгоритма минимакс (при ограничении по времени — максимальная глубина).
+    :param time_limit_ms: Ограничение времени на ход в миллисекундах или None.
+    :param stop_event: Событие threading.Event для отмены поиска или None.
+    :return: Лучший ход (объект Move) или None, если ходов нет или поиск на фиксированную глубину отменен.
+    """
+    position = Position.from_game(game)
+    try:
+        best_move = search_best_move(position, SearchContext(stop_event=stop_event), depth, time_limit_ms)
+    except SearchTimeout:
+        return None  # Поиск отменен
+    return best_move
+
+def search_best_move(position, search, depth=None, time_limit_ms=None, ponder=False):
+    """
+    Ищет лучший ход в позиции и сохраняет статистику поиска (см. find_best_move).
+    
+    :param position: Позиция (bitboard.Position).
+    :param search: Контекст поиска (SearchContext).
+    :param depth: Глубина поиска (при итеративном углублении — максимальная глубина).
+    :param time_limit_ms: Ограничение времени на ход в миллисекундах или None.
+    :param ponder: Флаг обдумывания на время соперника: итеративное углубление без ограничения времени,
+                   которое прерывается событием search.stop_event или назначенным позже search.deadline.
     :return: Лучший ход (объект Move) или None, если ходов нет.
+    :raises SearchTimeout: Если поиск на фиксированную глубину отменен.
+    """
+    global last_search_stats
+    start = time.perf_counter()
+    transposition_table.new_search()
+    tablebases.refresh()
+    moves = position.legal_moves()
+    best_move = None
+    source = 'ponder' if ponder else 'search'
+    if len(moves) == 1:
+        best_move = moves[0]  # Единственный ход не требует поиска
+        source = 'single move'
+    elif moves:
+        best_move = tablebase_move(position, moves)  # Ход из эндшпильной таблицы, если она есть
+        if best_move is not None:
+            source = 'tablebase'
+        elif time_limit_ms is None and not ponder:
+            best_move, _ = search_root_parallel(position, moves, depth or settings.AI_DEPTH, search)
+            search.depth = depth or settings.AI_DEPTH
+        else:
+            best_move = iterative_deepening(position, moves, depth or MAX_SEARCH_DEPTH, time_limit_ms, search)
+    best_move = to_game_move(position, best_move) if best_move is not None else None
+
+    last_search_stats = search.stats(time.perf_counter() - start)
+    last_search_stats['move'] = best_move.get_chess_notation() if best_move else None
+    last_search_stats['source'] = source
+    if settings.AI_STATS_FILE:
+        with open(settings.AI_STATS_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(last_search_stats, ensure_ascii=False) + '\n')
+    return best_move
+
+def expected_reply(position):
+    """
+    Предсказывает ход соперника: лучший ход из таблицы транспозиций (продолжение главного варианта
+    последнего поиска), а если его нет — лучший ход неглубокого поиска.
+    
+    :param position: Позиция (bitboard.Position), в которой ходит соперник.
+    :return: Закодированный ход или None, если ходов нет.
+    """
+    moves = position.legal_moves()
+    if not moves:
+        return None
+    entry = transposition_table.probe(position.hash)
+    if entry is not None and entry[3] in moves:
+        return entry[3]
+    best_move, _ = search_root(position, moves, PONDER_PREDICTION_DEPTH, SearchContext())
+    return best_move
+
+class AIWorker:
+    """
+    Фоновый поток, в котором ИИ ищет ходы, не блокируя игровой цикл.
+    
+    Запросы передаются через очередь requests, найденные ходы возвращаются через очередь results.
+    Пока идет поиск, объект игры не должен изменяться.
+    
+    После своего хода ИИ может обдумывать позицию на время соперника (ponder): предсказывает
+    ответ человека и ищет ход в позиции после него, заполняя таблицу транспозиций. Если человек
+    сделал предсказанный ход, request_move не начинает новый поиск, а продолжает обдумывание
+    до конца времени на ход, отсчитанного от начала обдумывания. Иначе обдумывание отменяется.
+    """
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.stop_event = threading.Event()  # Событие отмены последнего запроса
+        self.lock = threading.Lock()
+        self.ponder_stop = None  # Событие отмены обдумывания, пока его результат не востребован
+        self.ponder_key = None  # Ключ позиции, которая обдумывается (после предсказанного ответа)
+        self.ponder_search = None  # Контекст поиска обдумывания
+        self.ponder_start = 0.0
+        self.ponder_hit = False  # Человек сделал предсказанный ход, результат нужно вернуть
+        self.ponder_done = False  # Обдумывание завершилось раньше хода человека
+        self.ponder_result = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def request_move(self, game, depth=None, time_limit_ms=None):
+        """
+        Ставит в очередь поиск хода; результат (объект Move или None) появится в self.results.
+        Если позиция совпала с обдумываемой, используется результат обдумывания.
+        
+        :param game: Объект игры.
+        :param depth: Глубина поиска (см. find_best_move).
+        :param time_limit_ms: Ограничение времени на ход в миллисекундах или None.
+        """
+        if self.ponder_stop is not None and self.use_ponder(game, time_limit_ms):
+            return
+        self.stop_event = threading.Event()
+        self.requests.put(('move', game, depth, time_limit_ms, self.stop_event))
+
+    def ponder(self, game, depth=None, time_limit_ms=None):
+        """
+        Начинает обдумывание на время соперника. Поиск ведется на копии позиции,
+        поэтому после вызова объект игры можно изменять.
+        
+        :param game: Объект игры после хода ИИ.
+        :param depth: Глубина поиска (см. find_best_move).
+        :param time_limit_ms: Ограничение времени на ход в миллисекундах или None.
+        """
+        self.cancel()
+        self.stop_event = threading.Event()
+        with self.lock:
+            self.ponder_stop = self.stop_event
+            self.ponder_key = self.ponder_search = self.ponder_result = None
+            self.ponder_hit = self.ponder_done = False
+        self.requests.put(('ponder', Position.from_game(game), depth, time_limit_ms, self.stop_event))
+
+    def use_ponder(self, game, time_limit_ms):
+        """
+        Завершает обдумывание после хода человека: если позиция совпала с обдумываемой, найденный
+        ход попадет в results (поиск продолжается до конца времени на ход), иначе поиск отменяется.
+        
+        :param game: Объект игры после хода человека.
+        :param time_limit_ms: Ограничение времени на ход в миллисекундах или None.
+        :return: True, если ход будет взят из обдумывания.
+        """
+        key = Position.from_game(game).hash
+        with self.lock:
+            stop, self.ponder_stop = self.ponder_stop, None
+            if self.ponder_key != key:
+                stop.set()  # Человек сделал другой ход (или ответ еще не предсказан)
+                return False
+            if self.ponder_done:
+                self.publish(self.ponder_result)
+                return True
+            self.ponder_hit = True
+            if time_limit_ms is not None:
+                self.ponder_search.deadline = max(time.perf_counter(), self.ponder_start + time_limit_ms / 1000)
+            return True
+
+    def publish(self, move):
+        """
+        Передает найденный ход игровому циклу.
+        """
+        print(f"AI выбрал ход: {move.get_chess_notation() if move else 'Нет доступных ходов'}")
+        self.results.put(move)
+
+    def cancel(self):
+        """
+        Отменяет текущий поиск или обдумывание; результат в очередь не попадет.
+        """
+        with self.lock:
+            if self.ponder_stop is not None:
+                self.ponder_stop.set()
+                self.ponder_stop = None
+        self.stop_event.set()
+
+    def close(self):
+        """
+        Отменяет поиск и останавливает поток.
+        """
+        self.cancel()
+        self.requests.put(None)
+        self.thread.join()
+
+    def run(self):
+        """
+        Цикл потока: выполняет запросы по очереди до получения None.
+        """
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            kind, target, depth, time_limit_ms, stop_event = request
+            if kind == 'ponder':
+                self.run_ponder(target, depth, stop_event)
+                continue
+            move = find_best_move(target, depth=depth, time_limit_ms=time_limit_ms, stop_event=stop_event)
+            if not stop_event.is_set():
+                self.publish(move)  # Ход отмененного поиска не сообщается и не передается
+
+    def run_ponder(self, position, depth, stop_event):
+        """
+        Выполняет обдумывание: предсказывает ответ соперника и ищет ход в позиции после него.
+        
+        :param position: Позиция после хода ИИ (bitboard.Position).
+        :param depth: Глубина поиска или None.
+        :param stop_event: Событие отмены обдумывания.
+        """
+        reply = expected_reply(position)
+        if reply is None:
+            return
+        position.push(reply)
+        search = SearchContext(stop_event=stop_event)
+        with self.lock:
+            if stop_event.is_set():
+                return
+            self.ponder_key = position.hash
+            self.ponder_search = search
+            self.ponder_start = time.perf_counter()
+        move = search_best_move(position, search, depth, ponder=True)
+        with self.lock:
+            if stop_event.is_set():
+                return  # Обдумывание отменено
+            if self.ponder_hit:
+                self.publish(move)
+            else:
+                self.ponder_done = True
+                self.ponder_result = move
+
+def iterative_deepening(position, moves, max_depth, time_limit_ms, search):
+    """
+    Итеративное углубление с ограничением по времени.
+    
+    :param position: Позиция (bitboard.Position).
+    :param moves: Допустимые ходы позиции.
+    :param max_depth: Максимальная глубина поиска.
+    :param time_limit_ms: Ограничение времени в миллисекундах или None (поиск до глубины max_depth
+                          или до срока, назначенного в search.deadline позже, как при обдумывании).
+    :param search: Контекст поиска (SearchContext); ему назначается срок окончания поиска.
+    :return: Лучший ход последней завершенной итерации.
+    """
+    start = time.perf_counter()
+    root = len(position.history)  # При обдумывании корень лежит после предсказанного хода
+    budget = time_limit_ms / 1000 if time_limit_ms is not None else math.inf
+    if time_limit_ms is not None:
+        search.deadline = start + budget
+    best_move = moves[0]
+    best_value = None
+    for current_depth in range(1, max_depth + 1):
+        try:
+            best_move, best_value = search_root_parallel(position, moves, current_depth, search, best_move,
+                                                         guess=best_value)
+        except SearchTimeout:
+            # Итерация прервана: возвращаем позицию к корню, результат итерации не используется
+            while len(position.history) > root:
+                position.pop()
+            break
+        search.depth = current_depth
+        if abs(best_value) >= MATE_SCORE:
+            break  # Найден мат, дальнейшее углубление ничего не изменит
+        if time.perf_counter() - start > budget / 2:
+            break  # Следующая итерация заведомо не успеет завершиться
+    return best_move
+
+def tablebase_move(position, moves):
+    """
+    Выбирает ход по эндшпильным таблицам: самый быстрый выигрыш, иначе ничья,
+    иначе самый долгий проигрыш.
+    
+    :param position: Позиция (bitboard.Position).
+    :param moves: Допустимые ходы позиции.
+    :return: Закодированный ход или None, если хотя бы одна позиция после хода отсутствует в таблицах.
     """
     best_move = None
-    if game.white_to_move:
+    best_key = None
+    for move in moves:
+        position.push(move)
+        value = tablebases.probe(position)
+        position.pop()
+        if value is None:
+            return None
+        result, plies = decode_value(value)
+        # Результат после хода оценивается с точки зрения соперника
+        key = (-result, plies if result > 0 else -plies)
+        if best_key is None or key > best_key:
+            best_key = key
+            best_move = move
+    return best_move
+
+def tablebase_score(position, value):
+    """
+    Переводит значение эндшпильной таблицы в оценку поиска с точки зрения белых.
+    
+    :param position: Позиция (bitboard.Position).
+    :param value: Значение таблицы для стороны, которая ходит.
+    :return: Оценка позиции.
+    """
+    result, plies = decode_value(value)
+    score = result * (MATE_SCORE - plies)
+    return score if position.white_to_move else -score
+
+def search_root(position, moves, depth, search, first_move=None, guess=None):
+    """
+    Перебирает ходы корневой позиции на заданную глубину алгоритмом search.algorithm.
+    
+    :param position: Позиция (bitboard.Position).
+    :param moves: Допустимые ходы корневой позиции.
+    :param depth: Глубина поиска.
+    :param search: Контекст поиска (SearchContext).
+    :param first_move: Ход, который нужно проверить первым (лучший ход предыдущей итерации).
+    :param guess: Оценка предыдущей итерации для окна аспирации (только для PVS) или None.
+    :return: Кортеж (лучший ход, его оценка); без допустимых ходов — (None, оценка мата или пата).
+    """
+    if not moves:
+        return None, evaluate_terminal(position)  # Мат или пат: перебирать нечего
+    if search.algorithm == 'pvs':
+        return search_root_pvs(position, moves, depth, search, first_move, guess)
+    moves = order_moves(position, moves, first_move if first_move is not None else -1, search)
+    best_move = None
+    if position.white_to_move:
         best_value = -math.inf  # Инициализация для максимизации (ход белых)
-        for move in game.get_valid_moves():
-            game.make_move(move, update_state=False)
-            move_value = minimax(game, depth - 1, -math.inf, math.inf, False)  # Рекурсивный вызов минимакс
-            game.undo_move()
+        for move in moves:
+            position.push(move)
+            move_value = minimax(position, depth - 1, best_value, math.inf, False, search)  # Рекурсивный вызов минимакс
+            position.pop()
             if move_value > best_value:
                 best_value = move_value
                 best_move = move
     else:
         best_value = math.inf  # Инициализация для минимизации (ход черных)
-        for move in game.get_valid_moves():
-            game.make_move(move, update_state=False)
-            move_value = minimax(game, depth - 1, -math.inf, math.inf, True)  # Рекурсивный вызов минимакс
-            game.undo_move()
+        for move in moves:
+            position.push(move)
+            move_value = minimax(position, depth - 1, -math.inf, best_value, True, search)  # Рекурсивный вызов минимакс
+            position.pop()
             if move_value < best_value:
                 best_value = move_value
                 best_move = move
-    print(f"AI выбрал ход: {best_move.get_chess_notation() if best_move else 'Нет доступных ходов'}")
-    return best_move
+    return best_move, best_value
+
+def search_root_pvs(position, moves, depth, search, first_move=None, guess=None):
+    """
+    Поиск корня алгоритмом PVS с окном аспирации.
+    
+    Если известна оценка предыдущей итерации, корень сначала ищется в узком окне вокруг нее
+    (ASPIRATION_WINDOW): большинство ветвей отсекается быстрее. Если оценка вышла за окно,
+    соответствующая граница снимается и поиск повторяется.
+    
+    :param position: Позиция (bitboard.Position).
+    :param moves: Допустимые ходы корневой позиции.
+    :param depth: Глубина поиска.
+    :param search: Контекст поиска (SearchContext).
+    :param first_move: Ход, который нужно проверить первым (лучший ход предыдущей итерации).
+    :param guess: Оценка предыдущей итерации с точки зрения белых или None (поиск с полным окном).
+    :return: Кортеж (лучший ход, его оценка).
+    """
+    alpha, beta = -math.inf, math.inf
+    if guess is not None:
+        alpha, beta = guess - ASPIRATION_WINDOW, guess + ASPIRATION_WINDOW
+    while True:
+        ordered = order_moves(position, moves, first_move if first_move is not None else -1, search)
+        best_move, best_value = pvs_root(position, ordered, depth, alpha, beta, search)
+        if best_value <= alpha and alpha > -math.inf:
+            alpha = -math.inf  # Оценка ниже окна: повторяем поиск без нижней границы
+        elif best_value >= beta and beta < math.inf:
+            beta = math.inf  # Оценка выше окна: повторяем поиск без верхней границы
+            first_move = best_move
+        else:
+            return best_move, best_value
+
+def pvs_root(position, moves, depth, alpha, beta, search):
+    """
+    Перебирает ходы корня алгоритмом PVS в окне (alpha, beta).
+    
+    Первый ход ищется с полным окном, остальные — с нулевым окном, которое только проверяет,
+    что ход лучше найденного; ход, прошедший проверку, ищется повторно с полным окном.
+    
+    :param position: Позиция (bitboard.Position).
+    :param moves: Отсортированные ходы корневой позиции.
+    :param depth: Глубина поиска.
+    :param alpha: Нижняя граница окна (с точки зрения белых).
+    :param beta: Верхняя граница окна (с точки зрения белых).
+    :param search: Контекст поиска (SearchContext).
+    :return: Кортеж (лучший ход, его оценка с точки зрения белых); оценка вне окна — только граница.
+    """
+    if not moves:
+        return None, evaluate_terminal(position)
+    sign = 1 if position.white_to_move else -1
+    if sign < 0:
+        alpha, beta = -beta, -alpha  # Окно с точки зрения стороны, которая ходит
+    best_move = None
+    best_value = -math.inf
+    for index, move in enumerate(moves):
+        position.push(move)
+        if index == 0:
+            value = -pvs(position, depth - 1, -beta, -alpha, search)
+        else:
+            value = -pvs(position, depth - 1, -math.nextafter(alpha, math.inf), -alpha, search)
+            if alpha < value < beta:
+                value = -pvs(position, depth - 1, -beta, -alpha, search)
+        position.pop()
+        if value > best_value:
+            best_value = value
+            best_move = move
+        alpha = max(alpha, value)
+        if alpha >= beta:
+            break
+    return best_move, sign * best_value
+
+def search_root_parallel(position, moves, depth, search, first_move=None, workers=None, guess=None):
+    """
+    Параллельный вариант search_root: корневые ходы распределяются между процессами пула.
+    
+    Первый ход после сортировки ищется отдельно, чтобы остальные процессы сразу получили
+    хорошую границу. Затем каждый процесс берет очередной ход и ищет его с лучшей на этот
+    момент оценкой корня (общей для всех процессов). Ход выбирается по тем же правилам,
+    что и в search_root, поэтому при фиксированной глубине результат совпадает
+    с последовательным поиском. Если процессов меньше двух или fork недоступен,
+    выполняется обычный search_root. Окно аспирации используется только в последовательном поиске:
+    в параллельном роль узкого окна играет общая граница корня.
+    
+    :param position: Позиция (bitboard.Position).
+    :param moves: Допустимые ходы корневой позиции.
+    :param depth: Глубина поиска.
+    :param search: Контекст поиска (SearchContext); используется его deadline, узлы процессов суммируются.
+    :param first_move: Ход, который нужно проверить первым (лучший ход предыдущей итерации).
+    :param workers: Число процессов (по умолчанию settings.AI_WORKERS).
+    :param guess: Оценка предыдущей итерации для окна аспирации или None.
+    :return: Кортеж (лучший ход, его оценка).
+    """
+    pool = get_executor(workers or settings.AI_WORKERS)
+    if pool is None or len(moves) < 2:
+        return search_root(position, moves, depth, search, first_move, guess)
+    moves = order_moves(position, moves, first_move if first_move is not None else -1, search)
+    sign = 1 if position.white_to_move else -1
+    shared_bound.value = -sign * math.inf
+    args = (position, depth, search.deadline, transposition_table.generation, frozenset(tablebases.available),
+            search.algorithm)
+
+    def collect(future):
+        # Отмена поиска видна только основному процессу, поэтому результат ждем с проверками
+        while wait([future], timeout=0.05).not_done:
+            search.check_limits()
+        return future.result()
+
+    shared_stop.clear()
+    futures = []
+    try:
+        results = [collect(pool.submit(search_root_move, moves[0], *args))]
+        futures = [pool.submit(search_root_move, move, *args) for move in moves[1:]]
+        results += [collect(future) for future in futures]
+    except SearchTimeout:
+        shared_stop.set()  # Прерываем ходы, которые еще ищутся в процессах
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+    for _, _, _, counters in results:
+        search.add_counters(counters)
+    if any(value is None for _, value, _, _ in results):
+        raise SearchTimeout()
+
+    # Точная оценка получена только для ходов, которые оказались лучше границы на момент их поиска
+    best_index = None
+    for index, (_, value, bound, _) in enumerate(results):
+        if sign * value > sign * bound and (best_index is None or sign * value > sign * results[best_index][1]):
+            best_index = index
+    best_move, best_value = results[best_index][:2]
+
+    # Более ранний ход, отсеченный по той же оценке, может быть равноценен лучшему; последовательный
+    # поиск выбрал бы его, поэтому такой ход проверяется с границей чуть хуже лучшей оценки
+    for move, value, _, _ in results[:best_index]:
+        if value == best_value:
+            bound = math.nextafter(best_value, -sign * math.inf)
+            _, value, _, counters = collect(pool.submit(search_root_move, move, *args, bound))
+            search.add_counters(counters)
+            if value is None:
+                raise SearchTimeout()
+            if sign * value >= sign * best_value:
+                return move, value
+    return best_move, best_value
+
+def get_executor(workers):
+    """
+    Возвращает пул процессов для параллельного поиска, создавая его при первом обращении.
+    
+    Процессы создаются через fork: так они получают таблицы ИИ без повторной загрузки
+    и не импортируют заново главный модуль с интерфейсом.
+    
+    :param workers: Число процессов.
+    :return: Объект ProcessPoolExecutor или None, если процессов меньше двух или fork недоступен.
+    """
+    global executor, executor_workers, shared_bound, shared_stop
+    if workers < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    if executor is None or executor_workers != workers:
+        shutdown_executor()
+        context = multiprocessing.get_context('fork')
+        shared_bound = context.Value('d', 0.0)
+        shared_stop = context.Event()
+        executor = ProcessPoolExecutor(workers, mp_context=context,
+                                       initializer=init_worker, initargs=(shared_bound, shared_stop))
+        executor_workers = workers
+    return executor
+
+def shutdown_executor():
+    """
+    Останавливает пул процессов параллельного поиска (следующий поиск создаст его заново).
+    """
+    global executor, executor_workers
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+    executor = None
+    executor_workers = 0
+
+def init_worker(bound, stop):
+    """
+    Подготавливает процесс пула: запоминает общую границу оценки корня и событие отмены.
+    Эндшпильные таблицы по запросу строит только основной процесс.
+    
+    :param bound: Общее значение multiprocessing.Value с лучшей оценкой корня.
+    :param stop: Событие multiprocessing.Event, прерывающее поиск.
+    """
+    global shared_bound, shared_stop
+    shared_bound = bound
+    shared_stop = stop
+    tablebases.on_demand.clear()
+    tablebases.builders.clear()
+    tablebases.build_plans.clear()
+    tablebases.deferred.clear()
+
+def search_root_move(move, position, depth, deadline, generation, signatures, algorithm, bound=None):
+    """
+    Оценивает один корневой ход в процессе пула.
+    
+    :param move: Корневой ход.
+    :param position: Корневая позиция (bitboard.Position).
+    :param depth: Глубина поиска.
+    :param deadline: Момент прерывания поиска или None.
+    :param generation: Поколение таблицы транспозиций основного процесса.
+    :param signatures: Доступные в основном процессе эндшпильные таблицы.
+    :param algorithm: Алгоритм поиска из SEARCH_ALGORITHMS.
+    :param bound: Граница поиска; по умолчанию берется общая лучшая оценка корня.
+    :return: Кортеж (ход, оценка или None при прерывании поиска, граница поиска, счетчики статистики).
+    """
+    transposition_table.generation = generation
+    if not signatures <= tablebases.available:
+        tablebases.scan()  # Основной процесс достроил таблицы
+    if bound is None:
+        bound = shared_bound.value
+    search = SearchContext(deadline=deadline, stop_event=shared_stop, algorithm=algorithm)
+    white = position.white_to_move
+    position.push(move)
+    try:
+        if algorithm == 'pvs':
+            # Оценка нужна только если ход лучше границы: окно (bound, inf) для белых, (-inf, bound) для черных
+            value = -pvs(position, depth - 1, -math.inf, -bound, search) if white else \
+                pvs(position, depth - 1, -math.inf, bound, search)
+        elif white:
+            value = minimax(position, depth - 1, bound, math.inf, False, search)
+        else:
+            value = minimax(position, depth - 1, -math.inf, bound, True, search)
+    except SearchTimeout:
+        return move, None, bound, search.counters()
+    with shared_bound.get_lock():
+        if (value > shared_bound.value) if white else (value < shared_bound.value):
+            shared_bound.value = value
+    return move, value, bound, search.counters()
+
+def to_game_move(position, move):
+    """
+    Преобразует закодированный ход позиции в объект Move, совместимый с Game.
+    
+    :param position: Позиция (bitboard.Position) до выполнения хода.
+    :param move: Закодированный ход.
+    :return: Объект Move.
+    """
+    return Move.from_code(move, piece_name(position.mailbox[move_from(move)]),
+                          piece_name(position.mailbox[move_to(move)]))
+
+def order_moves(position, moves, hash_move, search):
+    """
+    Сортирует ходы так, чтобы альфа-бета отсечение происходило как можно раньше:
+    сначала ход из таблицы транспозиций, затем превращения, взятия по MVV-LVA,
+    ходы-убийцы текущего ply и остальные ходы по таблице истории.
+    
+    :param position: Позиция (bitboard.Position).
+    :param moves: Список закодированных ходов.
+    :param hash_move: Лучший ход из таблицы транспозиций или -1.
+    :param search: Контекст поиска (SearchContext).
+    :return: Отсортированный список ходов.
+    """
+    if not search.move_ordering:
+        return moves
+    mailbox = position.mailbox
+    killers = search.killers[min(len(position.history), MAX_SEARCH_DEPTH)]
+    history = search.history
+    scores = {}
+    for move in moves:
+        if move == hash_move:
+            score = HASH_MOVE_PRIORITY
+        elif move >> 12:
+            score = PROMOTION_PRIORITY + ORDERING_VALUES[move >> 12]
+        else:
+            captured = mailbox[(move >> 6) & 63]
+            if captured != EMPTY:
+                attacker = mailbox[move & 63]
+                score = CAPTURE_PRIORITY + 16 * ORDERING_VALUES[captured % 6] - ORDERING_VALUES[attacker % 6]
+            elif move == killers[0]:
+                score = KILLER_PRIORITY + 1
+            elif move == killers[1]:
+                score = KILLER_PRIORITY
+            else:
+                score = history[move & 4095]
+        scores[move] = score
+    return sorted(moves, key=scores.__getitem__, reverse=True)
 
-def minimax(game, depth, alpha, beta, is_maximizing):
+def minimax(position, depth, alpha, beta, is_maximizing, search=None):
     """
     Реализация алгоритма минимакс с альфа-бета отсечением для поиска лучшего хода.
+    Эталонный алгоритм (settings.AI_SEARCH_ALGORITHM = 'minimax'): каждый узел ищется с полным окном.
     
-    :param game: Объект игры, содержащий текущее состояние доски.
+    :param position: Позиция (bitboard.Position), на которой ведется поиск.
     :param depth: Глубина поиска.
     :param alpha: Лучшее значение для максимизирующего игрока.
     :param beta: Лучшее значение для минимизирующего игрока.
     :param is_maximizing: Флаг, указывающий, максимизирует ли текущий игрок оценку.
+    :param search: Контекст поиска (SearchContext) или None для поиска без ограничений.
     :return: Оценка позиции.
     """
-    if depth == 0 or game.checkmate or game.stalemate:
-        return evaluate_game(game)  # Оценка позиции, если достигнута глубина 0 или игра завершена
+    if search is None:
+        search = SearchContext()
+    search.nodes += 1
+    if search.nodes & 1023 == 0:
+        search.check_limits()  # Проверка времени раз в 1024 узла
+
+    # Повторение позиции оценивается как ничья
+    if position.is_repetition():
+        return 0
+
+    # Позиция из эндшпильной таблицы оценивается точно, без дальнейшего перебора
+    value = tablebases.probe(position)
+    if value is not None:
+        return tablebase_score(position, value)
+
+    if depth == 0:
+        # На горизонте продолжаем только взятия и превращения
+        return quiescence(position, alpha, beta, is_maximizing, search)
+
+    # Проверка таблицы транспозиций: позиция могла быть уже оценена через другой порядок ходов
+    key = position.hash
+    entry = transposition_table.probe(key)
+    hash_move = -1
+    if entry is not None:
+        hash_move = entry[3]
+        search.tt_hits += 1
+    if entry is not None and entry[0] >= depth:
+        _, flag, score, _ = entry
+        if flag == EXACT:
+            return score
+        if flag == LOWER_BOUND:
+            alpha = max(alpha, score)
+        else:
+            beta = min(beta, score)
+        if beta <= alpha:
+            return score
+    alpha_orig, beta_orig = alpha, beta
+
+    # Конец игры определяется по отсутствию допустимых ходов
+    moves = position.legal_moves()
+    if not moves:
+        return evaluate_terminal(position)
+    moves = order_moves(position, moves, hash_move, search)
 
+    best_move = -1
     if is_maximizing:
-        max_eval = -math.inf
-        for move in game.get_valid_moves():
-            game.make_move(move, update_state=False)
-            eval = minimax(game, depth - 1, alpha, beta, False)  # Рекурсивный вызов для минимизации
-            game.undo_move()
-            max_eval = max(max_eval, eval)
+        best_eval = -math.inf
+        for index, move in enumerate(moves):
+            position.push(move)
+            eval = minimax(position, depth - 1, alpha, beta, False, search)  # Рекурсивный вызов для минимизации
+            position.pop()
+            if eval > best_eval:
+                best_eval = eval
+                best_move = move
             alpha = max(alpha, eval)
             if beta <= alpha:  # Альфа-бета отсечение
+                search.record_cutoff(position, move, depth, index)
                 break
-        return max_eval
     else:
-        min_eval = math.inf
-        for move in game.get_valid_moves():
-            game.make_move(move, update_state=False)
-            eval = minimax(game, depth - 1, alpha, beta, True)  # Рекурсивный вызов для максимизации
-            game.undo_move()
-            min_eval = min(min_eval, eval)
+        best_eval = math.inf
+        for index, move in enumerate(moves):
+            position.push(move)
+            eval = minimax(position, depth - 1, alpha, beta, True, search)  # Рекурсивный вызов для максимизации
+            position.pop()
+            if eval < best_eval:
+                best_eval = eval
+                best_move = move
             beta = min(beta, eval)
             if beta <= alpha:  # Альфа-бета отсечение
+                search.record_cutoff(position, move, depth, index)
                 break
-        return min_eval
 
-def evaluate_game(game):
+    if best_eval <= alpha_orig:
+        flag = UPPER_BOUND
+    elif best_eval >= beta_orig:
+        flag = LOWER_BOUND
+    else:
+        flag = EXACT
+    transposition_table.store(key, depth, flag, best_eval, best_move)
+    return best_eval
+
+def pvs(position, depth, alpha, beta, search):
     """
-    Оценивает текущую позицию на доске, учитывая материал и случайный фактор для разнообразия ходов.
+    Поиск с главным вариантом (PVS) в форме negamax: оценка всегда дается с точки зрения
+    стороны, которая ходит. Первый ход ищется с полным окном, остальные — с нулевым окном
+    (alpha, alpha + ε); если ход оказался лучше alpha, он ищется повторно с полным окном.
+    При хорошей сортировке ходов повторные поиски редки, а поиски с нулевым окном дешевле.
+    Таблица транспозиций хранит оценки с точки зрения белых, как и в minimax.
     
-    :param game: Объект игры, содержащий текущее состояние доски.
+    :param position: Позиция (bitboard.Position).
+    :param depth: Глубина поиска.
+    :param alpha: Нижняя граница окна для стороны, которая ходит.
+    :param beta: Верхняя граница окна для стороны, которая ходит.
+    :param search: Контекст поиска (SearchContext).
+    :return: Оценка позиции с точки зрения стороны, которая ходит.
+    """
+    search.nodes += 1
+    if search.nodes & 1023 == 0:
+        search.check_limits()
+    if position.is_repetition():
+        return 0
+    sign = 1 if position.white_to_move else -1
+
+    value = tablebases.probe(position)
+    if value is not None:
+        return sign * tablebase_score(position, value)
+
+    if depth == 0:
+        if sign > 0:
+            return quiescence(position, alpha, beta, True, search)
+        return -quiescence(position, -beta, -alpha, False, search)
+
+    key = position.hash
+    entry = transposition_table.probe(key)
+    hash_move = -1
+    if entry is not None:
+        hash_move = entry[3]
+        search.tt_hits += 1
+    if entry is not None and entry[0] >= depth:
+        _, flag, score, _ = entry
+        if sign < 0:
+            flag, score = FLIPPED_BOUNDS[flag], -score
+        if flag == EXACT:
+            return score
+        if flag == LOWER_BOUND:
+            alpha = max(alpha, score)
+        else:
+            beta = min(beta, score)
+        if beta <= alpha:
+            return score
+    alpha_orig, beta_orig = alpha, beta
+
+    moves = position.legal_moves()
+    if not moves:
+        return sign * evaluate_terminal(position)
+    moves = order_moves(position, moves, hash_move, search)
+
+    best_move = -1
+    best_eval = -math.inf
+    for index, move in enumerate(moves):
+        position.push(move)
+        if index == 0:
+            eval = -pvs(position, depth - 1, -beta, -alpha, search)
+        else:
+            eval = -pvs(position, depth - 1, -math.nextafter(alpha, math.inf), -alpha, search)  # Нулевое окно
+            if alpha < eval < beta:
+                eval = -pvs(position, depth - 1, -beta, -alpha, search)  # Повторный поиск с полным окном
+        position.pop()
+        if eval > best_eval:
+            best_eval = eval
+            best_move = move
+        alpha = max(alpha, eval)
+        if alpha >= beta:
+            search.record_cutoff(position, move, depth, index)
+            break
+
+    if best_eval <= alpha_orig:
+        flag = UPPER_BOUND
+    elif best_eval >= beta_orig:
+        flag = LOWER_BOUND
+    else:
+        flag = EXACT
+    if sign < 0:
+        flag = FLIPPED_BOUNDS[flag]
+    transposition_table.store(key, depth, flag, sign * best_eval, best_move)
+    return best_eval
+
+def quiescence(position, alpha, beta, is_maximizing, search):
+    """
+    Поиск спокойствия: за горизонтом основного поиска перебираются только взятия и превращения,
+    чтобы оценка не делалась посреди размена или за ход до превращения пешки.
+    Оценка текущей позиции (stand pat) служит нижней границей для стороны, которая ходит.
+    
+    :param position: Позиция (bitboard.Position).
+    :param alpha: Лучшее значение для максимизирующего игрока.
+    :param beta: Лучшее значение для минимизирующего игрока.
+    :param is_maximizing: Флаг, указывающий, максимизирует ли текущий игрок оценку.
+    :param search: Контекст поиска (SearchContext).
     :return: Оценка позиции.
     """
-    piece_values = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}  # Значения фигур
-    white_score = 0
-    black_score = 0
-
-    for row in game.board:
-        for piece in row:
-            if piece != '--':
-                value = piece_values.get(piece[1], 0)  # Используем реальные значения фигур
-                if piece[0] == 'w':
-                    white_score += value
-                else:
-                    black_score += value
-
-    # Добавление случайного фактора для разнообразия ходов
-    random_factor = random.uniform(-0.5, 0.5)
-    evaluation = (white_score - black_score) + random_factor
-    print(f"Оценка позиции: {evaluation} (Белые: {white_score}, Черные: {black_score})")
-    return evaluation
+    search.nodes += 1
+    if search.nodes & 1023 == 0:
+        search.check_limits()
+
+    stand_pat = evaluate_game(position)
+    search.leaf_evaluations += 1
+    if is_maximizing:
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+    else:
+        if stand_pat <= alpha:
+            return stand_pat
+        beta = min(beta, stand_pat)
+
+    best_eval = stand_pat
+    for move in order_moves(position, position.legal_noisy_moves(), -1, search):
+        position.push(move)
+        eval = quiescence(position, alpha, beta, not is_maximizing, search)
+        position.pop()
+        if is_maximizing:
+            best_eval = max(best_eval, eval)
+            alpha = max(alpha, eval)
+        else:
+            best_eval = min(best_eval, eval)
+            beta = min(beta, eval)
+        if beta <= alpha:
+            break
+    return best_eval
+
+def evaluate_terminal(position):
+    """
+    Оценивает позицию, в которой у текущего игрока нет допустимых ходов.
+    
+    :param position: Позиция (bitboard.Position).
+    :return: Оценка мата с точки зрения белых или 0 при пате.
+    """
+    if position.in_check():
+        return -MATE_SCORE if position.white_to_move else MATE_SCORE
+    return 0
+
+def evaluate_game(position):
+    """
+    Оценивает текущую позицию на доске, учитывая материал, продвижение пешек, централизацию королей
+    и случайный фактор для разнообразия ходов.
+    
+    Материал и положение фигур обновляются в Position.push/pop, поэтому оценка выполняется за O(1).
+    Случайный фактор выводится из ключа Зобриста: одна и та же позиция всегда получает одну и ту же
+    оценку, и результаты поиска воспроизводимы.
+    Эндшпили, для которых известен результат (endgame.py), оцениваются по правилам без случайного фактора.
+    
+    :param position: Позиция (bitboard.Position).
+    :return: Оценка позиции с точки зрения белых (в пешках).
+    """
+    known = endgame.evaluate(position)
+    if known is not None:
+        return known
+    random_factor = ((position.hash & 0xFFFF) / 0x10000 - 0.5) * 2 * EVAL_JITTER
+    return position.score / 100 + random_factor
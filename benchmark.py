@@ -0,0 +1,202 @@
+# benchmark.py
+
+"""
+Бенчмарки поиска ИИ.
+
+Запуск: python benchmark.py ordering [--depth N]
+        python benchmark.py algorithms [--depth N]
+        python benchmark.py scaling [--depth N] [--workers 1 2 4 ...]
+        python benchmark.py moves [--count N]
+"""
+
+import argparse
+import os
+import time
+import tracemalloc
+import ai
+from bitboard import Position
+from game import Move
+from perft import game_from_fen
+
+# Позиции эндшпиля «король и пешка против короля и пешки» и позиции после превращения
+POSITIONS = [
+    ('start', '4k3/7p/8/8/8/8/P7/4K3 w - - 0 1'),
+    ('pawn race', '8/7p/8/2k5/8/5K2/P7/8 w - - 0 1'),
+    ('kings in front', '8/8/1k5p/8/P7/6K1/8/8 b - - 0 1'),
+    ('promotion', '8/P6k/8/8/8/8/6Kp/8 w - - 0 1'),
+    ('queen vs pawn', '8/8/8/3Q4/8/K7/1pk5/8 b - - 0 1'),
+]
+
+def load_position(fen):
+    """
+    Создает позицию из FEN и проверяет, что она допустима: король стороны, которая не ходит,
+    не под шахом (иначе поиск «берет» короля и замер теряет смысл).
+    
+    :param fen: Позиция в формате FEN.
+    :return: Позиция (bitboard.Position).
+    """
+    position = Position.from_fen(fen)
+    assert not position.in_check(position.side ^ 1), f'недопустимая позиция: {fen}'
+    return position
+
+def run_search(fen, depth, workers=1, **context_options):
+    """
+    Выполняет поиск на фиксированную глубину с пустой таблицей транспозиций.
+    
+    :param fen: Позиция в формате FEN.
+    :param depth: Глубина поиска.
+    :param workers: Число процессов поиска (1 — последовательный поиск).
+    :param context_options: Параметры SearchContext.
+    :return: Кортеж (число узлов, время в секундах, лучший ход).
+    """
+    position = load_position(fen)
+    ai.transposition_table.clear()
+    ai.shutdown_executor()
+    ai.get_executor(workers)  # Процессы получают пустую таблицу транспозиций и создаются до замера
+    search = ai.SearchContext(**context_options)
+    start = time.perf_counter()
+    best_move, _ = ai.search_root_parallel(position, position.legal_moves(), depth, search, workers=workers)
+    return search.nodes, time.perf_counter() - start, best_move
+
+def run_deepening(fen, depth, **context_options):
+    """
+    Выполняет итеративное углубление до заданной глубины без ограничения времени
+    с пустой таблицей транспозиций.
+    
+    :param fen: Позиция в формате FEN.
+    :param depth: Глубина последней итерации.
+    :param context_options: Параметры SearchContext.
+    :return: Кортеж (число узлов, время в секундах, лучший ход).
+    """
+    position = load_position(fen)
+    ai.transposition_table.clear()
+    search = ai.SearchContext(**context_options)
+    start = time.perf_counter()
+    best_move = ai.iterative_deepening(position, position.legal_moves(), depth, None, search)
+    return search.nodes, time.perf_counter() - start, best_move
+
+def benchmark_ordering(depth):
+    """
+    Сравнивает число узлов поиска с сортировкой ходов и без нее.
+    
+    :param depth: Глубина поиска.
+    """
+    print(f"{'позиция':<16}{'без сортировки':>16}{'с сортировкой':>16}{'сокращение':>12}")
+    total_plain = total_ordered = 0
+    for name, fen in POSITIONS:
+        plain, _, _ = run_search(fen, depth, move_ordering=False)
+        ordered, _, _ = run_search(fen, depth, move_ordering=True)
+        total_plain += plain
+        total_ordered += ordered
+        print(f"{name:<16}{plain:>16}{ordered:>16}{plain / max(ordered, 1):>11.2f}x")
+    print(f"{'итого':<16}{total_plain:>16}{total_ordered:>16}{total_plain / max(total_ordered, 1):>11.2f}x")
+
+def benchmark_algorithms(depth):
+    """
+    Сравнивает число узлов минимакса и PVS с окнами аспирации при итеративном углублении
+    до одной и той же глубины.
+    
+    :param depth: Глубина поиска.
+    """
+    print(f"{'позиция':<16}{'минимакс':>12}{'PVS':>12}{'сокращение':>12}{'время, с':>10}{'время PVS':>11}{'тот же ход':>12}")
+    total_minimax = total_pvs = 0
+    for name, fen in POSITIONS:
+        minimax_nodes, minimax_time, minimax_move = run_deepening(fen, depth, algorithm='minimax')
+        pvs_nodes, pvs_time, pvs_move = run_deepening(fen, depth, algorithm='pvs')
+        total_minimax += minimax_nodes
+        total_pvs += pvs_nodes
+        print(f"{name:<16}{minimax_nodes:>12}{pvs_nodes:>12}{minimax_nodes / max(pvs_nodes, 1):>11.2f}x"
+              f"{minimax_time:>10.2f}{pvs_time:>11.2f}{'да' if minimax_move == pvs_move else 'нет':>12}")
+    print(f"{'итого':<16}{total_minimax:>12}{total_pvs:>12}{total_minimax / max(total_pvs, 1):>11.2f}x")
+
+def benchmark_scaling(depth, workers_list):
+    """
+    Измеряет ускорение параллельного поиска по корневым ходам в зависимости от числа процессов.
+    
+    :param depth: Глубина поиска.
+    :param workers_list: Числа процессов для сравнения (первое — база для ускорения).
+    """
+    serial_moves = None
+    base_time = None
+    print(f"{'процессов':<10}{'узлов':>12}{'время, с':>12}{'ускорение':>12}{'те же ходы':>12}")
+    for workers in workers_list:
+        total_nodes = total_time = 0
+        moves = []
+        for _, fen in POSITIONS:
+            nodes, elapsed, best_move = run_search(fen, depth, workers)
+            total_nodes += nodes
+            total_time += elapsed
+            moves.append(best_move)
+        if serial_moves is None:
+            serial_moves, base_time = moves, total_time
+        same = sum(move == serial for move, serial in zip(moves, serial_moves))
+        print(f"{workers:<10}{total_nodes:>12}{total_time:>12.2f}{base_time / total_time:>11.2f}x"
+              f"{f'{same}/{len(moves)}':>12}")
+    ai.shutdown_executor()
+
+def benchmark_moves(count):
+    """
+    Измеряет память и скорость создания объектов Move и поиск хода среди допустимых
+    (списком, как раньше в Game.is_move_valid, и множеством).
+    
+    :param count: Число создаваемых ходов.
+    """
+    sample = [move for _, fen in POSITIONS for move in game_from_fen(fen).get_valid_moves()]
+    fields = [((move.start_row, move.start_col), (move.end_row, move.end_col), move.piece_moved,
+               move.piece_captured, move.is_pawn_promotion, move.promotion_choice) for move in sample]
+    codes = [(move.code, move.piece_moved, move.piece_captured) for move in sample]
+    fields = (fields * (count // len(fields) + 1))[:count]
+    codes = (codes * (count // len(codes) + 1))[:count]
+
+    tracemalloc.start()
+    moves = [Move(*args) for args in fields]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del moves
+    start = time.perf_counter()
+    moves = [Move(*args) for args in fields]
+    constructor_time = time.perf_counter() - start
+    start = time.perf_counter()
+    moves = [Move.from_code(*args) for args in codes]
+    from_code_time = time.perf_counter() - start
+
+    lookups = moves[:min(count, 10000)]
+    sample_set = set(sample)
+    start = time.perf_counter()
+    found_list = sum(move in sample for move in lookups)
+    list_time = time.perf_counter() - start
+    start = time.perf_counter()
+    found_set = sum(move in sample_set for move in lookups)
+    set_time = time.perf_counter() - start
+
+    print(f"ходов: {count}, памяти: {size / count:.1f} байт на ход (вместе с элементом списка)")
+    print(f"Move(...): {count / constructor_time:.0f} ходов/с, "
+          f"Move.from_code: {count / from_code_time:.0f} ходов/с")
+    print(f"поиск среди {len(sample)} ходов: список {list_time / len(lookups) * 1e6:.2f} мкс, "
+          f"множество {set_time / len(lookups) * 1e6:.2f} мкс (найдено {found_list}/{found_set})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки поиска ИИ')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    ordering = subparsers.add_parser('ordering', help='число узлов с сортировкой ходов и без нее')
+    ordering.add_argument('--depth', type=int, default=5)
+    algorithms = subparsers.add_parser('algorithms', help='число узлов минимакса и PVS на одной глубине')
+    algorithms.add_argument('--depth', type=int, default=9)
+    scaling = subparsers.add_parser('scaling', help='ускорение параллельного поиска по числу процессов')
+    scaling.add_argument('--depth', type=int, default=7)
+    scaling.add_argument('--workers', type=int, nargs='+',
+                         default=[n for n in (1, 2, 4, 8, 16) if n <= (os.cpu_count() or 1)] or [1])
+    moves = subparsers.add_parser('moves', help='память и скорость создания объектов Move')
+    moves.add_argument('--count', type=int, default=200000)
+    args = parser.parse_args()
+    if args.command == 'ordering':
+        benchmark_ordering(args.depth)
+    elif args.command == 'algorithms':
+        benchmark_algorithms(args.depth)
+    elif args.command == 'scaling':
+        benchmark_scaling(args.depth, args.workers)
+    elif args.command == 'moves':
+        benchmark_moves(args.count)
+
+if __name__ == '__main__':
+    main()
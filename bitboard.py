@@ -0,0 +1,666 @@
+# bitboard.py
+
+"""
+Битбордовое представление позиции для поиска ИИ.
+
+Каждая фигура каждого цвета хранится как 64-битное целое число, где бит с номером
+row * 8 + col соответствует клетке board[row][col] (row 0 — восьмая горизонталь).
+Позиция конвертируется в формат Game.board и обратно, поэтому интерфейс и класс Move
+не зависят от внутреннего представления.
+"""
+
+import random
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+PIECE_CHARS = 'PNBRQK'
+COLOR_CHARS = 'wb'
+EMPTY = -1
+
+# Фигуры, в которые может превратиться пешка (в порядке генерации ходов)
+PROMOTION_PIECES = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# Ранги превращения и начальные ряды пешек в координатах Game.board
+PROMOTION_ROW = (0, 7)
+PAWN_START_ROW = (6, 1)
+
+ALL_SQUARES = (1 << 64) - 1
+
+# Вклад фигуры в ключ материала: по 4 бита на счетчик каждого кода фигуры
+MATERIAL_KEYS = tuple(1 << (4 * code) for code in range(12))
+
+
+def square(row, col):
+    """
+    Возвращает номер клетки по ряду и колонке.
+    
+    :param row: Ряд клетки.
+    :param col: Колонка клетки.
+    :return: Номер клетки (0..63).
+    """
+    return row * 8 + col
+
+
+def encode_move(from_sq, to_sq, promotion=0):
+    """
+    Упаковывает ход в целое число: 6 бит начальной клетки, 6 бит конечной и фигура превращения.
+    
+    :param from_sq: Начальная клетка.
+    :param to_sq: Конечная клетка.
+    :param promotion: Фигура превращения (KNIGHT..QUEEN) или 0.
+    :return: Закодированный ход.
+    """
+    return from_sq | (to_sq << 6) | (promotion << 12)
+
+
+def move_from(move):
+    """
+    Возвращает начальную клетку закодированного хода.
+    """
+    return move & 63
+
+
+def move_to(move):
+    """
+    Возвращает конечную клетку закодированного хода.
+    """
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    """
+    Возвращает фигуру превращения закодированного хода (0, если превращения нет).
+    """
+    return move >> 12
+
+
+def piece_code(color, piece):
+    """
+    Возвращает код фигуры для массива клеток (mailbox).
+    
+    :param color: Цвет фигуры (WHITE или BLACK).
+    :param piece: Тип фигуры (PAWN..KING).
+    :return: Код фигуры.
+    """
+    return color * 6 + piece
+
+
+def piece_name(code):
+    """
+    Преобразует код фигуры в строку формата Game.board ('wK', 'bP', '--').
+    
+    :param code: Код фигуры или EMPTY.
+    :return: Строка с обозначением фигуры.
+    """
+    if code == EMPTY:
+        return '--'
+    return COLOR_CHARS[code // 6] + PIECE_CHARS[code % 6]
+
+
+def piece_code_from_name(name):
+    """
+    Преобразует строку формата Game.board ('wK', 'bP', '--') в код фигуры.
+    
+    :param name: Строка с обозначением фигуры.
+    :return: Код фигуры или EMPTY.
+    """
+    if name == '--':
+        return EMPTY
+    return piece_code(COLOR_CHARS.index(name[0]), PIECE_CHARS.index(name[1]))
+
+
+def material_key(white, black):
+    """
+    Возвращает ключ материала (Position.material) для набора фигур белых и черных.
+    
+    :param white: Типы фигур белых.
+    :param black: Типы фигур черных.
+    :return: Ключ материала.
+    """
+    return (sum(MATERIAL_KEYS[piece_code(WHITE, piece)] for piece in white) +
+            sum(MATERIAL_KEYS[piece_code(BLACK, piece)] for piece in black))
+
+
+# Ключ материала позиции, в которой остались только короли
+ONLY_KINGS_MATERIAL = material_key((KING,), (KING,))
+
+
+def iter_bits(bb):
+    """
+    Перебирает номера установленных битов битборда.
+    
+    :param bb: Битборд.
+    """
+    while bb:
+        lsb = bb & -bb
+        yield lsb.bit_length() - 1
+        bb ^= lsb
+
+
+def popcount(bb):
+    """
+    Возвращает количество установленных битов битборда.
+    """
+    return bin(bb).count('1')
+
+
+def board_from_fen(fen):
+    """
+    Разбирает расстановку фигур и очередь хода из строки FEN.
+    
+    :param fen: Строка FEN (поля рокировки, взятия на проходе и счетчики ходов игнорируются).
+    :return: Кортеж (доска в формате Game.board, флаг хода белых).
+    """
+    fields = fen.split()
+    board = []
+    for rank in fields[0].split('/'):
+        row = []
+        for char in rank:
+            if char.isdigit():
+                row.extend(['--'] * int(char))
+            else:
+                row.append(('w' if char.isupper() else 'b') + char.upper())
+        board.append(row)
+    white_to_move = len(fields) < 2 or fields[1] == 'w'
+    return board, white_to_move
+
+
+def board_to_fen(board, white_to_move, halfmove_clock=0):
+    """
+    Записывает расстановку фигур, очередь хода и счетчик полуходов в строку FEN.
+    
+    :param board: Доска в формате Game.board.
+    :param white_to_move: Флаг, указывающий, ходят ли белые.
+    :param halfmove_clock: Число полуходов после последнего хода пешкой или взятия.
+    :return: Строка FEN.
+    """
+    ranks = []
+    for row in board:
+        rank = ''
+        empty = 0
+        for name in row:
+            if name == '--':
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += name[1] if name[0] == 'w' else name[1].lower()
+        if empty:
+            rank += str(empty)
+        ranks.append(rank)
+    return '/'.join(ranks) + (' w' if white_to_move else ' b') + f' - - {halfmove_clock} 1'
+
+
+def _leaper_attacks(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for dr, dc in offsets:
+            r, c = row + dr, col + dc
+            if 0 <= r < 8 and 0 <= c < 8:
+                bb |= 1 << square(r, c)
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _leaper_attacks([(-2, -1), (-1, -2), (-2, 1), (-1, 2),
+                                  (1, -2), (2, -1), (1, 2), (2, 1)])
+KING_ATTACKS = _leaper_attacks([(-1, -1), (-1, 0), (-1, 1),
+                                (0, -1), (0, 1),
+                                (1, -1), (1, 0), (1, 1)])
+# PAWN_ATTACKS[color][sq] — клетки, которые бьёт пешка цвета color, стоящая на sq
+PAWN_ATTACKS = (_leaper_attacks([(-1, -1), (-1, 1)]),
+                _leaper_attacks([(1, -1), (1, 1)]))
+
+# Лучи для дальнобойных фигур. Для направлений с возрастающим номером клетки
+# ближайший блокирующий бит — младший, для убывающих — старший.
+ROOK_DIRECTIONS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+BISHOP_DIRECTIONS = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+
+
+def _ray_table(dr, dc):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        r, c = row + dr, col + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            bb |= 1 << square(r, c)
+            r += dr
+            c += dc
+        table.append(bb)
+    return table
+
+
+def _is_positive(dr, dc):
+    return dr * 8 + dc > 0
+
+
+ROOK_RAYS = [(_ray_table(dr, dc), _is_positive(dr, dc)) for dr, dc in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(_ray_table(dr, dc), _is_positive(dr, dc)) for dr, dc in BISHOP_DIRECTIONS]
+
+
+def _slider_attacks(rays, sq, occupied):
+    attacks = 0
+    for table, positive in rays:
+        ray = table[sq]
+        blockers = ray & occupied
+        if blockers:
+            if positive:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= table[first]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    """
+    Возвращает клетки, атакуемые ладьей с клетки sq при заданной занятости доски.
+    """
+    return _slider_attacks(ROOK_RAYS, sq, occupied)
+
+
+def bishop_attacks(sq, occupied):
+    """
+    Возвращает клетки, атакуемые слоном с клетки sq при заданной занятости доски.
+    """
+    return _slider_attacks(BISHOP_RAYS, sq, occupied)
+
+
+def _zobrist_keys():
+    # Фиксированное зерно: ключи одинаковы между запусками и процессами
+    rng = random.Random(0x5EED)
+    pieces = [[rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
+    return pieces, rng.getrandbits(64)
+
+
+# ZOBRIST_PIECES[код фигуры][клетка] и ключ стороны, которая ходит (черные)
+ZOBRIST_PIECES, ZOBRIST_SIDE = _zobrist_keys()
+
+
+# Оценка позиции ведется в сотых долях пешки, чтобы инкрементальная сумма не накапливала
+# ошибок округления: стоимость фигур, бонус пешки за каждый пройденный ряд (от начального
+# ряда до предпоследнего) и бонус короля за каждый шаг от края доски к центру
+PIECE_VALUES_CP = (100, 300, 300, 500, 900, 0)
+PAWN_ADVANCE_BONUS = (0, 5, 10, 20, 30, 50)
+KING_CENTER_BONUS = 10
+
+
+def _piece_square_values():
+    # Стоимость фигуры на клетке с точки зрения белых (для черных фигур — со знаком минус)
+    table = []
+    for color in (WHITE, BLACK):
+        for piece in range(6):
+            values = []
+            for sq in range(64):
+                row, col = divmod(sq, 8)
+                value = PIECE_VALUES_CP[piece]
+                if piece == PAWN and 1 <= row <= 6:
+                    value += PAWN_ADVANCE_BONUS[6 - row if color == WHITE else row - 1]
+                elif piece == KING:
+                    edge_distance = 3 - max(abs(2 * row - 7), abs(2 * col - 7)) // 2
+                    value += KING_CENTER_BONUS * edge_distance
+                values.append(value if color == WHITE else -value)
+            table.append(values)
+    return table
+
+
+# PIECE_SQUARE_VALUES[код фигуры][клетка]
+PIECE_SQUARE_VALUES = _piece_square_values()
+
+
+class Position:
+    """
+    Позиция на битбордах с поддержкой быстрых ходов и их отмены для поиска.
+    """
+    def __init__(self):
+        self.pieces = [[0] * 6, [0] * 6]
+        self.occupied = [0, 0]
+        self.mailbox = [EMPTY] * 64
+        self.side = WHITE
+        self.history = []
+        self.hash = 0  # Ключ Зобриста, обновляется инкрементально в push/pop
+        self.material = 0  # Ключ материала: одинаков для всех позиций с одинаковым набором фигур
+        self.score = 0  # Материал и положение фигур в сотых долях пешки с точки зрения белых
+        self.key_history = []  # Ключи Зобриста предыдущих позиций (с ходами партии до начала поиска)
+        self.irreversible = 0  # Индекс в key_history первой позиции после последнего хода пешкой или взятия
+
+    @classmethod
+    def from_board(cls, board, white_to_move=True):
+        """
+        Создает позицию из доски в формате Game.board.
+        
+        :param board: Доска (список списков строк вида 'wK', '--').
+        :param white_to_move: Флаг, указывающий, ходят ли белые.
+        :return: Объект Position.
+        """
+        position = cls()
+        for r in range(8):
+            for c in range(8):
+                code = piece_code_from_name(board[r][c])
+                if code != EMPTY:
+                    position.put_piece(code // 6, code % 6, square(r, c))
+        position.side = WHITE if white_to_move else BLACK
+        if position.side == BLACK:
+            position.hash ^= ZOBRIST_SIDE
+        return position
+
+    @classmethod
+    def from_game(cls, game):
+        """
+        Создает позицию из текущего состояния объекта Game. Ключи позиций партии после последнего
+        хода пешкой или взятия (game.halfmove_clock) переносятся в key_history, чтобы поиск видел
+        повторения позиций партии; ходы партии для этого не нужны.
+        
+        :param game: Объект игры.
+        :return: Объект Position.
+        """
+        position = cls.from_board(game.board, game.white_to_move)
+        # У партии, загруженной из снимка, история ключей короче счетчика полуходов
+        keys = game.position_keys
+        position.key_history = [key for key, _ in keys[max(len(keys) - 1 - game.halfmove_clock, 0):-1]]
+        return position
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        Создает позицию из строки FEN.
+        
+        :param fen: Строка FEN.
+        :return: Объект Position.
+        """
+        return cls.from_board(*board_from_fen(fen))
+
+    def to_fen(self):
+        """
+        Возвращает строку FEN позиции.
+        
+        :return: Строка FEN.
+        """
+        return board_to_fen(self.to_board(), self.white_to_move)
+
+    def to_board(self):
+        """
+        Преобразует позицию в доску формата Game.board.
+        
+        :return: Доска (список списков строк).
+        """
+        return [[piece_name(self.mailbox[square(r, c)]) for c in range(8)] for r in range(8)]
+
+    @property
+    def white_to_move(self):
+        """
+        Флаг, указывающий, ходят ли белые (совместим с Game.white_to_move).
+        """
+        return self.side == WHITE
+
+    def put_piece(self, color, piece, sq):
+        """
+        Ставит фигуру на клетку.
+        
+        :param color: Цвет фигуры.
+        :param piece: Тип фигуры.
+        :param sq: Номер клетки.
+        """
+        bit = 1 << sq
+        self.pieces[color][piece] |= bit
+        self.occupied[color] |= bit
+        code = piece_code(color, piece)
+        self.mailbox[sq] = code
+        self.hash ^= ZOBRIST_PIECES[code][sq]
+        self.material += MATERIAL_KEYS[code]
+        self.score += PIECE_SQUARE_VALUES[code][sq]
+
+    def remove_piece(self, color, piece, sq):
+        """
+        Убирает фигуру с клетки.
+        
+        :param color: Цвет фигуры.
+        :param piece: Тип фигуры.
+        :param sq: Номер клетки.
+        """
+        bit = 1 << sq
+        self.pieces[color][piece] ^= bit
+        self.occupied[color] ^= bit
+        self.mailbox[sq] = EMPTY
+        code = piece_code(color, piece)
+        self.hash ^= ZOBRIST_PIECES[code][sq]
+        self.material -= MATERIAL_KEYS[code]
+        self.score -= PIECE_SQUARE_VALUES[code][sq]
+
+    def compute_hash(self):
+        """
+        Вычисляет ключ Зобриста позиции с нуля (для проверки инкрементального ключа).
+        
+        :return: 64-битный ключ позиции.
+        """
+        key = ZOBRIST_SIDE if self.side == BLACK else 0
+        for sq, code in enumerate(self.mailbox):
+            if code != EMPTY:
+                key ^= ZOBRIST_PIECES[code][sq]
+        return key
+
+    def compute_score(self):
+        """
+        Вычисляет оценку материала и положения фигур с нуля (для проверки инкрементальной оценки).
+        
+        :return: Оценка в сотых долях пешки с точки зрения белых.
+        """
+        return sum(PIECE_SQUARE_VALUES[code][sq] for sq, code in enumerate(self.mailbox) if code != EMPTY)
+
+    def king_square(self, color):
+        """
+        Возвращает клетку короля указанного цвета или None, если короля нет.
+        """
+        king = self.pieces[color][KING]
+        if not king:
+            return None
+        return king.bit_length() - 1
+
+    def is_square_attacked(self, sq, by_color):
+        """
+        Проверяет, атакована ли клетка фигурами указанного цвета.
+        
+        :param sq: Номер клетки.
+        :param by_color: Цвет атакующих фигур.
+        :return: True, если клетка атакована, иначе False.
+        """
+        enemy = self.pieces[by_color]
+        if PAWN_ATTACKS[by_color ^ 1][sq] & enemy[PAWN]:
+            return True
+        if KNIGHT_ATTACKS[sq] & enemy[KNIGHT]:
+            return True
+        if KING_ATTACKS[sq] & enemy[KING]:
+            return True
+        occupied = self.occupied[WHITE] | self.occupied[BLACK]
+        rooks = enemy[ROOK] | enemy[QUEEN]
+        if rooks and rook_attacks(sq, occupied) & rooks:
+            return True
+        bishops = enemy[BISHOP] | enemy[QUEEN]
+        if bishops and bishop_attacks(sq, occupied) & bishops:
+            return True
+        return False
+
+    def in_check(self, color=None):
+        """
+        Проверяет, находится ли король указанного цвета под шахом.
+        
+        :param color: Цвет короля (по умолчанию — сторона, которая ходит).
+        :return: True, если король под шахом или отсутствует, иначе False.
+        """
+        if color is None:
+            color = self.side
+        king_sq = self.king_square(color)
+        if king_sq is None:
+            # Король отсутствует, считается, что игрок находится под шахом
+            return True
+        return self.is_square_attacked(king_sq, color ^ 1)
+
+    def generate_pseudo_legal_moves(self):
+        """
+        Возвращает все ходы текущего игрока без учета шаха.
+        
+        :return: Список закодированных ходов.
+        """
+        moves = []
+        color = self.side
+        own = self.pieces[color]
+        own_occ = self.occupied[color]
+        enemy_occ = self.occupied[color ^ 1]
+        occupied = own_occ | enemy_occ
+        targets = ALL_SQUARES ^ own_occ
+
+        # Пешки
+        step = -8 if color == WHITE else 8
+        promotion_row = PROMOTION_ROW[color]
+        start_row = PAWN_START_ROW[color]
+        for from_sq in iter_bits(own[PAWN]):
+            destinations = PAWN_ATTACKS[color][from_sq] & enemy_occ
+            one = from_sq + step
+            if 0 <= one < 64 and not (occupied >> one) & 1:
+                destinations |= 1 << one
+                if from_sq // 8 == start_row and not (occupied >> (one + step)) & 1:
+                    destinations |= 1 << (one + step)
+            for to_sq in iter_bits(destinations):
+                if to_sq // 8 == promotion_row:
+                    for promotion in PROMOTION_PIECES:
+                        moves.append(from_sq | (to_sq << 6) | (promotion << 12))
+                else:
+                    moves.append(from_sq | (to_sq << 6))
+
+        for from_sq in iter_bits(own[KNIGHT]):
+            for to_sq in iter_bits(KNIGHT_ATTACKS[from_sq] & targets):
+                moves.append(from_sq | (to_sq << 6))
+        for from_sq in iter_bits(own[BISHOP] | own[QUEEN]):
+            for to_sq in iter_bits(bishop_attacks(from_sq, occupied) & targets):
+                moves.append(from_sq | (to_sq << 6))
+        for from_sq in iter_bits(own[ROOK] | own[QUEEN]):
+            for to_sq in iter_bits(rook_attacks(from_sq, occupied) & targets):
+                moves.append(from_sq | (to_sq << 6))
+        for from_sq in iter_bits(own[KING]):
+            for to_sq in iter_bits(KING_ATTACKS[from_sq] & targets):
+                moves.append(from_sq | (to_sq << 6))
+        return moves
+
+    def legal_moves(self):
+        """
+        Возвращает допустимые ходы текущего игрока.
+        
+        :return: Список закодированных ходов.
+        """
+        return self.filter_legal(self.generate_pseudo_legal_moves())
+
+    def legal_noisy_moves(self):
+        """
+        Возвращает допустимые взятия и превращения текущего игрока (для поиска спокойствия).
+        
+        :return: Список закодированных ходов.
+        """
+        enemy_occ = self.occupied[self.side ^ 1]
+        return self.filter_legal([move for move in self.generate_pseudo_legal_moves()
+                                  if move >> 12 or (enemy_occ >> ((move >> 6) & 63)) & 1])
+
+    def filter_legal(self, moves):
+        """
+        Отбирает ходы, после которых король текущего игрока не под шахом.
+        Ход не выполняется: атаки на короля проверяются по битбордам с учетом
+        освободившейся и занятой клеток и снятой при взятии фигуры.
+        
+        :param moves: Список ходов без учета шаха.
+        :return: Список допустимых ходов.
+        """
+        color = self.side
+        king_sq = self.king_square(color)
+        if king_sq is None:
+            # Король отсутствует, считается, что игрок находится под шахом
+            return []
+        enemy = self.pieces[color ^ 1]
+        pawn_attacks = PAWN_ATTACKS[color]
+        occupied = self.occupied[WHITE] | self.occupied[BLACK]
+        legal = []
+        for move in moves:
+            from_sq = move & 63
+            to_bit = 1 << ((move >> 6) & 63)
+            king = (move >> 6) & 63 if from_sq == king_sq else king_sq
+            remaining = ~to_bit  # Взятая фигура больше не атакует
+            if pawn_attacks[king] & enemy[PAWN] & remaining:
+                continue
+            if KNIGHT_ATTACKS[king] & enemy[KNIGHT] & remaining:
+                continue
+            if KING_ATTACKS[king] & enemy[KING]:
+                continue
+            after = (occupied ^ (1 << from_sq)) | to_bit
+            rooks = (enemy[ROOK] | enemy[QUEEN]) & remaining
+            if rooks and rook_attacks(king, after) & rooks:
+                continue
+            bishops = (enemy[BISHOP] | enemy[QUEEN]) & remaining
+            if bishops and bishop_attacks(king, after) & bishops:
+                continue
+            legal.append(move)
+        return legal
+
+    def push(self, move):
+        """
+        Выполняет ход без каких-либо побочных эффектов (без сохранения и проверки конца игры).
+        
+        :param move: Закодированный ход.
+        """
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        promotion = move >> 12
+        color = self.side
+        moved = self.mailbox[from_sq]
+        captured = self.mailbox[to_sq]
+        self.history.append((move, moved, captured, self.irreversible))
+        self.key_history.append(self.hash)
+        if captured != EMPTY:
+            self.remove_piece(captured // 6, captured % 6, to_sq)
+        self.remove_piece(color, moved % 6, from_sq)
+        self.put_piece(color, promotion if promotion else moved % 6, to_sq)
+        if captured != EMPTY or moved % 6 == PAWN:
+            self.irreversible = len(self.key_history)  # Предыдущие позиции больше не могут повториться
+        self.side = color ^ 1
+        self.hash ^= ZOBRIST_SIDE
+
+    def pop(self):
+        """
+        Отменяет последний ход, выполненный через push.
+        
+        :return: Отмененный закодированный ход.
+        """
+        move, moved, captured, self.irreversible = self.history.pop()
+        self.key_history.pop()
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        color = self.side ^ 1
+        self.side = color
+        self.hash ^= ZOBRIST_SIDE
+        self.remove_piece(color, self.mailbox[to_sq] % 6, to_sq)
+        self.put_piece(color, moved % 6, from_sq)
+        if captured != EMPTY:
+            self.put_piece(captured // 6, captured % 6, to_sq)
+        return move
+
+    def is_repetition(self):
+        """
+        Проверяет, встречалась ли позиция раньше (в партии или на пути поиска) с той же стороной,
+        которая ходит. Сравниваются только позиции после последнего хода пешкой или взятия.
+        
+        :return: True, если позиция повторилась, иначе False.
+        """
+        keys = self.key_history
+        for index in range(len(keys) - 2, self.irreversible - 1, -2):
+            if keys[index] == self.hash:
+                return True
+        return False
+
+    def piece_count(self, color, piece):
+        """
+        Возвращает количество фигур указанного типа и цвета.
+        """
+        return popcount(self.pieces[color][piece])
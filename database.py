@@ -1,21 +1,83 @@
 # database.py
 
+import atexit
+import queue
 import sqlite3
+import threading
 import os
 from datetime import datetime
 import json
 
 DATABASE_FILE = 'chess.db'
 
+# Режим синхронизации SQLite: в режиме WAL значение NORMAL не теряет целостности базы,
+# а fsync выполняется только при контрольной точке журнала
+DATABASE_SYNCHRONOUS = 'NORMAL'
+
+# Версия схемы базы данных (PRAGMA user_version); initialize_db переводит старые базы на текущую версию
+SCHEMA_VERSION = 2
+
+# Поля партии, которые возвращают get_game_by_id и get_games_by_user
+GAME_COLUMNS = 'game_id, white_player, black_player, moves, result, start_time, end_time, status'
+
+# Число подготовленных запросов, которые каждое соединение хранит в кэше
+DATABASE_STATEMENT_CACHE = 64
+
+# Соединение каждого потока (соединение SQLite нельзя использовать из нескольких потоков сразу)
+_local = threading.local()
+# Все открытые соединения, чтобы закрыть их при выходе
+_connections = []
+_connections_lock = threading.Lock()
+
+def open_connection(database_file):
+    """
+    Открывает новое соединение с базой данных в режиме журнала WAL.
+    
+    :param database_file: Путь к файлу базы данных.
+    :return: Объект соединения с базой данных.
+    """
+    # Соединением пользуется только открывший его поток; check_same_thread отключен,
+    # чтобы close_connections могла закрыть при выходе соединения завершившихся потоков
+    conn = sqlite3.connect(database_file, timeout=30, cached_statements=DATABASE_STATEMENT_CACHE,
+                           check_same_thread=False)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute(f'PRAGMA synchronous = {DATABASE_SYNCHRONOUS}')
+    return conn
+
 def get_connection():
     """
-    Возвращает соединение с базой данных.
+    Возвращает долгоживущее соединение текущего потока с базой данных, открывая его
+    при первом обращении (или если DATABASE_FILE изменился). Соединение нельзя закрывать:
+    оно используется повторно и закрывается функцией close_connections.
     
     :return: Объект соединения с базой данных.
     """
-    conn = sqlite3.connect(DATABASE_FILE)
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.database_file != DATABASE_FILE:
+        if conn is not None:
+            # Соединение с прежним файлом больше не понадобится этому потоку
+            with _connections_lock:
+                if conn in _connections:
+                    _connections.remove(conn)
+            conn.close()
+        conn = open_connection(DATABASE_FILE)
+        _local.conn, _local.database_file = conn, DATABASE_FILE
+        with _connections_lock:
+            _connections.append(conn)
     return conn
 
+def close_connections():
+    """
+    Закрывает все соединения, открытые get_connection (вызывается при выходе из программы).
+    """
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+    _local.__dict__.clear()
+
+atexit.register(close_connections)
+
 def initialize_db():
     """
     Инициализирует базу данных, создавая таблицы пользователей и партий, если они еще не существуют.
@@ -37,7 +99,7 @@ def initialize_db():
             game_id INTEGER PRIMARY KEY AUTOINCREMENT,
             white_player TEXT NOT NULL,
             black_player TEXT NOT NULL,
-            moves TEXT NOT NULL,  -- Сохранение ходов в формате JSON
+            moves TEXT NOT NULL,  -- Устаревшее поле: ходы хранятся в таблице moves
             result TEXT,
             start_time TEXT,
             end_time TEXT,
@@ -47,8 +109,46 @@ def initialize_db():
         )
     ''')
 
+    # Создание таблицы ходов: по строке на полуход, ход — два байта (BLOB, Move.to_bytes)
+    # или JSON-строка (TEXT, Move.to_dict)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS moves (
+            game_id INTEGER NOT NULL,
+            ply INTEGER NOT NULL,  -- Номер полухода, начиная с 0
+            move NOT NULL,
+            PRIMARY KEY (game_id, ply),
+            FOREIGN KEY (game_id) REFERENCES games(game_id)
+        ) WITHOUT ROWID
+    ''')
+
     conn.commit()
-    conn.close()
+    migrate_db(conn)
+
+def migrate_db(conn):
+    """
+    Переводит базу данных на версию схемы SCHEMA_VERSION. Версия 1: ходы партий переносятся
+    из JSON-списка в поле games.moves в таблицу moves. Версия 2: в таблицу games добавляется
+    снимок позиции после последнего сохраненного хода.
+    
+    :param conn: Соединение с базой данных.
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version < 1:
+        with conn:
+            rows = conn.execute("SELECT game_id, moves FROM games WHERE moves != '[]'").fetchall()
+            for game_id, moves in rows:
+                conn.executemany('INSERT OR REPLACE INTO moves (game_id, ply, move) VALUES (?, ?, ?)',
+                                 [(game_id, ply, json.dumps(move)) for ply, move in enumerate(json.loads(moves))])
+                conn.execute("UPDATE games SET moves = '[]' WHERE game_id = ?", (game_id,))
+            conn.execute('PRAGMA user_version = 1')
+    if version < 2:
+        # Снимок позиции: FEN (расстановка и очередь хода), число ходов, после которых он сделан,
+        # и итог позиции ('checkmate', 'stalemate' или NULL); у старых партий снимка нет
+        with conn:
+            conn.execute('ALTER TABLE games ADD COLUMN position_fen TEXT')
+            conn.execute('ALTER TABLE games ADD COLUMN position_ply INTEGER')
+            conn.execute('ALTER TABLE games ADD COLUMN position_state TEXT')
+            conn.execute('PRAGMA user_version = 2')
 
 def save_user(username, password_hash):
     """
@@ -59,15 +159,12 @@ def save_user(username, password_hash):
     :return: Кортеж (успех, сообщение).
     """
     conn = get_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, password_hash))
-        conn.commit()
+        with conn:
+            conn.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, password_hash))
         return True, 'Пользователь успешно зарегистрирован.'
     except sqlite3.IntegrityError:
         return False, 'Пользователь уже существует.'
-    finally:
-        conn.close()
 
 def get_user(username):
     """
@@ -76,12 +173,7 @@ def get_user(username):
     :param username: Имя пользователя.
     :return: Данные пользователя или None, если пользователь не найден.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    return get_connection().execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
 
 def create_new_game(white_player, black_player):
     """
@@ -92,38 +184,216 @@ def create_new_game(white_player, black_player):
     :return: ID созданной партии.
     """
     conn = get_connection()
-    cursor = conn.cursor()
     start_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     moves_json = json.dumps([])
-    cursor.execute('''
-        INSERT INTO games (white_player, black_player, moves, result, start_time, end_time, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (white_player, black_player, moves_json, None, start_time, None, 'in_progress'))
-    game_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return game_id
+    with conn:
+        cursor = conn.execute('''
+            INSERT INTO games (white_player, black_player, moves, result, start_time, end_time, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (white_player, black_player, moves_json, None, start_time, None, 'in_progress'))
+    return cursor.lastrowid
 
-def update_game(game_id, moves, result=None, end_time=None, status='in_progress'):
+def update_game(game_id, first_ply, moves, result=None, end_time=None, status='in_progress',
+                position_fen=None, position_state=None):
     """
-    Обновляет данные партии в базе данных.
+    Обновляет данные партии в базе данных в одной транзакции: ходы начиная с полухода first_ply
+    удаляются и заменяются ходами moves (после обычного хода это одна вставка, после отмены
+    хода — одно удаление), затем обновляются результат, статус и снимок позиции.
     
     :param game_id: ID партии.
-    :param moves: Список ходов в формате JSON.
+    :param first_ply: Номер полухода, с которого записываются ходы.
+    :param moves: Ходы начиная с полухода first_ply: два байта Move.to_bytes или словари Move.to_dict.
     :param result: Результат партии.
     :param end_time: Время завершения партии.
     :param status: Статус партии ('in_progress' или 'completed').
+    :param position_fen: FEN позиции после всех ходов партии или None, если снимка нет.
+    :param position_state: Итог позиции ('checkmate', 'stalemate' или None).
     """
     conn = get_connection()
-    cursor = conn.cursor()
-    moves_json = json.dumps(moves)
-    cursor.execute('''
+    with conn:
+        write_game(conn, game_id, first_ply, moves, result, end_time, status, position_fen, position_state)
+
+def write_game(conn, game_id, first_ply, moves, result=None, end_time=None, status='in_progress',
+               position_fen=None, position_state=None):
+    """
+    Выполняет запросы update_game в текущей транзакции соединения, не фиксируя ее.
+    
+    :param conn: Соединение с базой данных.
+    Остальные параметры — как у update_game.
+    """
+    conn.execute('DELETE FROM moves WHERE game_id = ? AND ply >= ?', (game_id, first_ply))
+    conn.executemany('INSERT INTO moves (game_id, ply, move) VALUES (?, ?, ?)',
+                     [(game_id, ply, move if isinstance(move, bytes) else json.dumps(move))
+                      for ply, move in enumerate(moves, first_ply)])
+    conn.execute('''
         UPDATE games
-        SET moves = ?, result = ?, end_time = ?, status = ?
+        SET result = ?, end_time = ?, status = ?, position_fen = ?, position_ply = ?, position_state = ?
         WHERE game_id = ?
-    ''', (moves_json, result, end_time, status, game_id))
-    conn.commit()
-    conn.close()
+    ''', (result, end_time, status, position_fen, first_ply + len(moves), position_state, game_id))
+
+def merge_updates(earlier, later):
+    """
+    Объединяет два последовательных обновления одной партии (словари параметров update_game)
+    в одно с тем же итоговым результатом.
+    
+    :param earlier: Более раннее обновление.
+    :param later: Более позднее обновление.
+    :return: Объединенное обновление.
+    """
+    merged = dict(later)
+    if later['first_ply'] > earlier['first_ply']:
+        # Ходы раннего обновления до начала позднего остаются, остальные заменяются
+        merged['first_ply'] = earlier['first_ply']
+        merged['moves'] = list(earlier['moves'][:later['first_ply'] - earlier['first_ply']]) + list(later['moves'])
+    return merged
+
+# Запрос потоку GameWriter повторить запись неудавшихся обновлений
+RETRY = 'retry'
+
+class GameWriter:
+    """
+    Фоновый поток отложенной записи партий (write-behind): update_game ставит обновление
+    в очередь и сразу возвращается. Поток забирает все накопившиеся обновления, объединяет
+    обновления одной партии и записывает их в одной транзакции.
+    
+    Обновления, которые не удалось записать, не теряются: они объединяются со следующими
+    и записываются повторно. flush ждет записи всего, что было поставлено в очередь до вызова,
+    и переносит журнал WAL в файл базы данных; если запись так и не удалась, flush
+    выбрасывает ошибку. close делает то же и останавливает поток.
+    """
+    def __init__(self):
+        self.requests = queue.Queue()
+        self.failed = {}  # Незаписанные обновления по ID партий
+        self.error = None  # Ошибка последней неудачной записи
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def update_game(self, **update):
+        """
+        Ставит в очередь обновление партии.
+        
+        :param update: Параметры update_game.
+        """
+        self.requests.put(update)
+
+    def flush(self):
+        """
+        Ждет, пока все поставленные в очередь обновления будут записаны, и переносит
+        журнал WAL в файл базы данных, чтобы последнее состояние партий сохранилось на диске.
+        
+        :raises sqlite3.Error: Если обновления не удалось записать и при повторной попытке.
+        """
+        self.requests.join()
+        if self.failed:
+            self.requests.put(RETRY)  # Повторная попытка записать неудавшиеся обновления
+            self.requests.join()
+            if self.failed:
+                raise self.error
+        get_connection().execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def close(self):
+        """
+        Записывает все отложенные обновления и останавливает поток.
+        """
+        try:
+            self.flush()
+        finally:
+            self.requests.put(None)
+            self.thread.join()
+
+    def run(self):
+        """
+        Цикл потока: записывает обновления пачками до получения None.
+        """
+        while True:
+            batch = [self.requests.get()]
+            while True:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            updates = self.failed  # Неудавшиеся обновления раньше новых
+            for update in batch:
+                if isinstance(update, dict):
+                    game_id = update['game_id']
+                    updates[game_id] = merge_updates(updates[game_id], update) if game_id in updates else update
+            try:
+                conn = get_connection()
+                with conn:
+                    for update in updates.values():
+                        write_game(conn, **update)
+                self.failed, self.error = {}, None
+            except sqlite3.Error as error:
+                print(f"Ошибка записи партий в базу данных: {error}")
+                self.failed, self.error = updates, error
+            for _ in batch:
+                self.requests.task_done()
+            if None in batch:
+                break
+
+# Поток отложенной записи партий (создается при первом обращении)
+_game_writer = None
+_game_writer_lock = threading.Lock()
+
+def get_game_writer():
+    """
+    Возвращает поток отложенной записи партий, запуская его при первом обращении.
+    
+    :return: Объект GameWriter.
+    """
+    global _game_writer
+    with _game_writer_lock:
+        if _game_writer is None:
+            _game_writer = GameWriter()
+        return _game_writer
+
+def flush_games():
+    """
+    Записывает все отложенные обновления партий (если поток отложенной записи запущен).
+    """
+    if _game_writer is not None:
+        _game_writer.flush()
+
+def close_game_writer():
+    """
+    Записывает отложенные обновления и останавливает поток отложенной записи
+    (вызывается при выходе из программы, до закрытия соединений).
+    """
+    global _game_writer
+    with _game_writer_lock:
+        writer, _game_writer = _game_writer, None
+    if writer is not None:
+        writer.close()
+
+# Обработчики atexit вызываются в обратном порядке: сначала запись, потом закрытие соединений
+atexit.register(close_game_writer)
+
+def get_moves(game_id, first_ply=0, end_ply=None):
+    """
+    Читает ходы партии по порядку полуходов, не загружая их все сразу.
+    
+    :param game_id: ID партии.
+    :param first_ply: Номер первого читаемого полухода.
+    :param end_ply: Номер полухода, перед которым чтение заканчивается, или None (до конца партии).
+    :return: Генератор записей ходов: два байта Move.to_bytes или словари Move.to_dict.
+    """
+    sql = 'SELECT move FROM moves WHERE game_id = ? AND ply >= ?'
+    params = [game_id, first_ply]
+    if end_ply is not None:
+        sql += ' AND ply < ?'
+        params.append(end_ply)
+    for move, in get_connection().execute(sql + ' ORDER BY ply', params):
+        yield move if isinstance(move, bytes) else json.loads(move)
+
+def get_move_count(game_id):
+    """
+    Возвращает число сохраненных полуходов партии (по номеру последнего, без чтения всех ходов).
+    
+    :param game_id: ID партии.
+    :return: Число полуходов.
+    """
+    return get_connection().execute('SELECT COALESCE(MAX(ply) + 1, 0) FROM moves WHERE game_id = ?',
+                                    (game_id,)).fetchone()[0]
 
 def get_games_by_user(username, status=None):
     """
@@ -136,20 +406,18 @@ def get_games_by_user(username, status=None):
     conn = get_connection()
     cursor = conn.cursor()
     if status:
-        cursor.execute('''
-            SELECT * FROM games 
+        cursor.execute(f'''
+            SELECT {GAME_COLUMNS} FROM games
             WHERE (white_player = ? OR black_player = ?) AND status = ?
             ORDER BY start_time DESC
         ''', (username, username, status))
     else:
-        cursor.execute('''
-            SELECT * FROM games 
+        cursor.execute(f'''
+            SELECT {GAME_COLUMNS} FROM games
             WHERE white_player = ? OR black_player = ?
             ORDER BY start_time DESC
         ''', (username, username))
-    games = cursor.fetchall()
-    conn.close()
-    return games
+    return cursor.fetchall()
 
 def get_game_by_id(game_id):
     """
@@ -158,9 +426,15 @@ def get_game_by_id(game_id):
     :param game_id: ID партии.
     :return: Данные партии или None, если партия не найдена.
     """
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM games WHERE game_id = ?', (game_id,))
-    game = cursor.fetchone()
-    conn.close()
-    return game
+    return get_connection().execute(f'SELECT {GAME_COLUMNS} FROM games WHERE game_id = ?', (game_id,)).fetchone()
+
+def get_game_snapshot(game_id):
+    """
+    Получает снимок позиции партии, записанный вместе с последним сохранением.
+    
+    :param game_id: ID партии.
+    :return: Кортеж (FEN, число ходов, итог позиции) или None, если снимка нет.
+    """
+    row = get_connection().execute('SELECT position_fen, position_ply, position_state FROM games WHERE game_id = ?',
+                                   (game_id,)).fetchone()
+    return row if row and row[0] is not None else None
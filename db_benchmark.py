@@ -0,0 +1,261 @@
+# db_benchmark.py
+
+"""
+Бенчмарки хранения партий в базе данных SQLite. Замеры выполняются на временных файлах
+базы данных, рабочая база chess.db не затрагивается.
+
+Запуск: python db_benchmark.py latency [--calls N] [--moves N]
+        python db_benchmark.py save [--plies N]
+        python db_benchmark.py codec [--games N] [--plies N]
+        python db_benchmark.py writes [--plies N]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import database
+
+# Запросы прежних функций database.py (ходы хранились JSON-списком в поле games.moves)
+UPDATE_GAME_SQL = '''
+    UPDATE games
+    SET moves = ?, result = ?, end_time = ?, status = ?
+    WHERE game_id = ?
+'''
+GET_GAME_SQL = 'SELECT * FROM games WHERE game_id = ?'
+GET_USER_SQL = 'SELECT * FROM users WHERE username = ?'
+
+def sample_moves(count):
+    """
+    Создает список ходов в формате Move.to_dict для сохранения в партии.
+    
+    :param count: Число ходов.
+    :return: Список словарей ходов.
+    """
+    return [{'start_pos': (7, ply % 8), 'end_pos': (6, ply % 8), 'piece_moved': 'wK', 'piece_captured': '--',
+             'is_pawn_promotion': False, 'promotion_choice': 'Q'} for ply in range(count)]
+
+def execute_per_call(database_file, sql, params, commit=False):
+    """
+    Выполняет один запрос так, как это делали функции database.py до пула соединений:
+    новое соединение в режиме журнала отката, запрос, фиксация и закрытие.
+    
+    :param database_file: Путь к файлу базы данных.
+    :param sql: Текст запроса.
+    :param params: Параметры запроса.
+    :param commit: Фиксировать ли транзакцию.
+    :return: Первая строка результата или None.
+    """
+    conn = sqlite3.connect(database_file)
+    cursor = conn.cursor()
+    cursor.execute(sql, params)
+    row = cursor.fetchone()
+    if commit:
+        conn.commit()
+    conn.close()
+    return row
+
+def measure(function, calls):
+    """
+    Измеряет среднее время одного вызова функции.
+    
+    :param function: Функция без аргументов.
+    :param calls: Число вызовов.
+    :return: Среднее время вызова в микросекундах.
+    """
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls * 1e6
+
+def create_databases(directory):
+    """
+    Создает во временном каталоге две базы данных с пользователем и партией (game_id 1):
+    для замера прежнего способа (журнал отката, соединение на каждый вызов) и текущего.
+    
+    :param directory: Каталог для файлов баз данных.
+    :return: Кортеж (путь к базе для прежнего способа, путь к базе для текущего).
+    """
+    per_call_file = os.path.join(directory, 'per_call.db')
+    pooled_file = os.path.join(directory, 'pooled.db')
+    for database_file in (per_call_file, pooled_file):
+        database.DATABASE_FILE = database_file
+        database.initialize_db()
+        database.save_user('user', 'hash')
+        database.create_new_game('user', 'AI')
+    database.close_connections()
+    # Файл для замера «до» возвращается в режим журнала отката, в котором работали прежние функции
+    execute_per_call(per_call_file, 'PRAGMA journal_mode = DELETE', ())
+    database.DATABASE_FILE = pooled_file
+    return per_call_file, pooled_file
+
+def benchmark_latency(calls, move_count):
+    """
+    Сравнивает время одного вызова update_game (сохранение после хода), get_game_by_id
+    и get_user прежним способом (новое соединение на каждый вызов, все ходы JSON-списком)
+    и текущим (долгоживущее соединение в режиме WAL, строка таблицы moves на ход).
+    
+    :param calls: Число вызовов каждой функции.
+    :param move_count: Число ходов в сохраняемой партии.
+    """
+    moves = sample_moves(move_count)
+    with tempfile.TemporaryDirectory() as directory:
+        per_call_file, _ = create_databases(directory)
+        database.update_game(1, 0, moves[:-1])
+        cases = [
+            ('update_game',
+             lambda: execute_per_call(per_call_file, UPDATE_GAME_SQL,
+                                      (json.dumps(moves), None, None, 'in_progress', 1), commit=True),
+             lambda: database.update_game(1, move_count - 1, moves[-1:])),
+            ('get_game_by_id',
+             lambda: execute_per_call(per_call_file, GET_GAME_SQL, (1,)),
+             lambda: database.get_game_by_id(1)),
+            ('get_user',
+             lambda: execute_per_call(per_call_file, GET_USER_SQL, ('user',)),
+             lambda: database.get_user('user')),
+        ]
+        print(f"{'функция':<16}{'до, мкс':>12}{'после, мкс':>12}{'ускорение':>12}")
+        for name, before, after in cases:
+            before_time = measure(before, calls)
+            after_time = measure(after, calls)
+            print(f"{name:<16}{before_time:>12.1f}{after_time:>12.1f}{before_time / after_time:>11.2f}x")
+        database.close_connections()
+
+def benchmark_save(plies):
+    """
+    Сравнивает время записи всей партии с сохранением после каждого хода: прежним способом
+    (перезапись JSON-списка всех ходов, O(n) на ход) и текущим (вставка одной строки).
+    
+    :param plies: Число полуходов в партии.
+    """
+    moves = sample_moves(plies)
+    with tempfile.TemporaryDirectory() as directory:
+        per_call_file, _ = create_databases(directory)
+        start = time.perf_counter()
+        for ply in range(1, plies + 1):
+            execute_per_call(per_call_file, UPDATE_GAME_SQL,
+                             (json.dumps(moves[:ply]), None, None, 'in_progress', 1), commit=True)
+        before_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for ply in range(plies):
+            database.update_game(1, ply, moves[ply:ply + 1])
+        after_time = time.perf_counter() - start
+        loaded = len(list(database.get_moves(1)))
+        database.close_connections()
+    print(f"полуходов: {plies} (прочитано обратно: {loaded})")
+    print(f"{'способ':<24}{'всего, с':>10}{'на ход, мкс':>14}")
+    print(f"{'JSON-список в games':<24}{before_time:>10.3f}{before_time / plies * 1e6:>14.1f}")
+    print(f"{'строка в moves':<24}{after_time:>10.3f}{after_time / plies * 1e6:>14.1f}")
+
+def benchmark_writes(plies):
+    """
+    Сравнивает задержку сохранения после хода для вызывающего потока при синхронной записи
+    (update_game) и при отложенной записи в фоновом потоке (GameWriter), а также общее время
+    до того, как все ходы записаны.
+    
+    :param plies: Наибольшее число полуходов в партии.
+    """
+    moves = [move.to_bytes() for move in random_games(1, plies)[0]]
+    print(f"полуходов: {len(moves)}")
+    print(f"{'запись':<12}{'на ход, мкс':>14}{'макс., мкс':>12}{'всего, с':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        create_databases(directory)
+        for name, save in (('синхронная', database.update_game), ('отложенная', None)):
+            game_id = database.create_new_game('user', 'AI')
+            writer = database.GameWriter() if save is None else None
+            save = save or writer.update_game
+            delays = []
+            start = time.perf_counter()
+            for ply, move in enumerate(moves):
+                call_start = time.perf_counter()
+                save(game_id=game_id, first_ply=ply, moves=[move])
+                delays.append(time.perf_counter() - call_start)
+            if writer is not None:
+                writer.close()
+            total_time = time.perf_counter() - start
+            assert list(database.get_moves(game_id)) == moves
+            print(f"{name:<12}{sum(delays) / len(delays) * 1e6:>14.1f}{max(delays) * 1e6:>12.1f}{total_time:>10.3f}")
+        database.close_connections()
+
+def random_games(count, max_plies, seed=1):
+    """
+    Создает корпус партий из случайных допустимых ходов с начальной позиции.
+    
+    :param count: Число партий.
+    :param max_plies: Наибольшее число полуходов в партии.
+    :param seed: Начальное значение генератора случайных чисел.
+    :return: Список партий (списков объектов Move).
+    """
+    from game import Game  # Импорт здесь: остальным замерам не нужен pygame
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        game = Game()
+        while len(game.move_log) < max_plies and not game.is_only_kings():
+            moves = game.get_valid_moves()
+            if not moves:
+                break
+            game.make_move(rng.choice(moves), update_state=False)
+        games.append(game.move_log)
+    return games
+
+def benchmark_codec(game_count, max_plies):
+    """
+    Сравнивает размер базы данных и время загрузки партий при хранении ходов
+    JSON-словарями и двухбайтовыми кодами.
+    
+    :param game_count: Число партий в корпусе.
+    :param max_plies: Наибольшее число полуходов в партии.
+    """
+    from game import Game
+    games = random_games(game_count, max_plies)
+    plies = sum(len(moves) for moves in games)
+    print(f"партий: {game_count}, полуходов: {plies}")
+    print(f"{'формат':<10}{'база, КБ':>12}{'байт на ход':>14}{'загрузка, с':>14}{'на ход, мкс':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for storage_format, encode in (('json', lambda move: move.to_dict()), ('binary', lambda move: move.to_bytes())):
+            database.DATABASE_FILE = os.path.join(directory, f'{storage_format}.db')
+            database.initialize_db()
+            for moves in games:
+                game_id = database.create_new_game('user', 'AI')
+                database.update_game(game_id, 0, [encode(move) for move in moves])
+            conn = database.get_connection()
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            move_bytes = conn.execute('SELECT SUM(LENGTH(move)) FROM moves').fetchone()[0]
+            size = os.path.getsize(database.DATABASE_FILE)
+            start = time.perf_counter()
+            loaded = [Game.decode_moves(database.get_moves(game_id)) for game_id in range(1, game_count + 1)]
+            load_time = time.perf_counter() - start
+            assert loaded == games
+            print(f"{storage_format:<10}{size / 1024:>12.0f}{move_bytes / plies:>14.1f}"
+                  f"{load_time:>14.3f}{load_time / plies * 1e6:>14.1f}")
+        database.close_connections()
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки хранения партий')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    latency = subparsers.add_parser('latency', help='время одного вызова функций database.py')
+    latency.add_argument('--calls', type=int, default=500)
+    latency.add_argument('--moves', type=int, default=60, help='число ходов в сохраняемой партии')
+    save = subparsers.add_parser('save', help='запись партии с сохранением после каждого хода')
+    save.add_argument('--plies', type=int, default=1000)
+    codec = subparsers.add_parser('codec', help='размер базы и время загрузки партий для форматов ходов')
+    codec.add_argument('--games', type=int, default=2000)
+    codec.add_argument('--plies', type=int, default=200, help='наибольшее число полуходов в партии')
+    writes = subparsers.add_parser('writes', help='задержка сохранения после хода: синхронная и отложенная запись')
+    writes.add_argument('--plies', type=int, default=300, help='наибольшее число полуходов в партии')
+    args = parser.parse_args()
+    if args.command == 'latency':
+        benchmark_latency(args.calls, args.moves)
+    elif args.command == 'save':
+        benchmark_save(args.plies)
+    elif args.command == 'codec':
+        benchmark_codec(args.games, args.plies)
+    elif args.command == 'writes':
+        benchmark_writes(args.plies)
+
+if __name__ == '__main__':
+    main()
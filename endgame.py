@@ -0,0 +1,320 @@
+# endgame.py
+
+"""
+Знания об эндшпилях игры для оценки позиции без перебора.
+
+Король и пешка против короля (KPK): правило квадрата, незащищенная пешка, ничейные позиции
+с крайней пешкой, ключевые поля, оппозиция и блокада. Каждое правило проверено на всех
+позициях таблицы KPK (tablebase.py): если правило дает ответ, он совпадает с таблицей.
+Король и пешка против короля и пешки (KPKP): гонка пешек — чья пешка неудержима, кто
+первым проводит ферзя, не теряется ли новый ферзь сразу и успевает ли он остановить пешку соперника.
+После превращения (KQK, KRK, KQKP) сильнейшая сторона оценивается как выигрывающая.
+
+Оценка дается в пешках с точки зрения белых: около ±KNOWN_WIN_SCORE для известного выигрыша
+(ближе к превращению и к мату — больше), 0 для известной ничьей и None, если правила
+не дают надежного ответа и позицию нужно оценивать обычным способом.
+
+Проверка на позициях с известным результатом: python endgame.py [--depth N]
+"""
+
+import argparse
+import sys
+from bitboard import Position, WHITE, BLACK, PAWN, ROOK, QUEEN, KING, material_key, square
+
+# Оценка известного выигрыша: больше любого материального перевеса и меньше оценки мата
+KNOWN_WIN_SCORE = 100
+
+# Позиции с известным результатом: (имя, FEN, результат '1-0', '0-1' или '1/2-1/2')
+CORPUS = [
+    ('square: pawn runs', '8/8/8/8/P7/8/5k2/K7 w - - 0 1', '1-0'),
+    ('square: black pawn runs', 'k7/8/1K6/8/8/6p1/8/8 b - - 0 1', '0-1'),
+    ('pawn en prise', '8/8/8/8/3k4/3P4/8/7K b - - 0 1', '1/2-1/2'),
+    ('rook pawn: king ahead', '8/k7/8/8/P7/8/8/1K6 w - - 0 1', '1/2-1/2'),
+    ('rook pawn: corner', 'k7/8/P7/1K6/8/8/8/8 w - - 0 1', '1/2-1/2'),
+    ('key square reached', '8/4k3/8/3K4/8/4P3/8/8 w - - 0 1', '1-0'),
+    ('key square: pawn on 5th', '8/8/3K1k2/4P3/8/8/8/8 b - - 0 1', '1-0'),
+    ('key square: king in front', '4k3/8/4K3/4P3/8/8/8/8 w - - 0 1', '1-0'),
+    ('opposition: defender to move', '8/8/4k3/8/4K3/4P3/8/8 b - - 0 1', '1-0'),
+    ('opposition: defender holds', '8/8/4k3/8/4K3/4P3/8/8 w - - 0 1', '1/2-1/2'),
+    ('blockade', '8/8/8/4k3/4P3/4K3/8/8 w - - 0 1', '1/2-1/2'),
+    ('defender two squares ahead', '8/8/4k3/8/4P3/3K4/8/8 w - - 0 1', '1/2-1/2'),
+    ('race: black pawn too slow', '8/4p3/8/8/P7/8/8/k5K1 w - - 0 1', '1-0'),
+    ('race: black queens first', '8/8/1P6/8/8/4k3/7p/K7 b - - 0 1', '0-1'),
+    ('queen against pawn', '8/8/5K2/8/3Q4/8/1p6/2k5 w - - 0 1', '1-0'),
+    ('queen mates', '8/8/8/4k3/8/8/8/KQ6 w - - 0 1', '1-0'),
+    ('rook mates', '8/8/8/4k3/8/8/8/KR6 b - - 0 1', '1-0'),
+    ('queen stalemates', 'k7/8/1Q6/8/8/8/8/2K5 b - - 0 1', '1/2-1/2'),
+]
+
+def distance(a, b):
+    """
+    Возвращает расстояние между клетками в ходах короля.
+    """
+    return max(abs((a >> 3) - (b >> 3)), abs((a & 7) - (b & 7)))
+
+def relative(sq, color):
+    """
+    Переводит клетку в систему координат, где указанная сторона играет белыми (черные — зеркально по рядам).
+    """
+    return sq if color == WHITE else sq ^ 56
+
+def moves_to_queen(sq):
+    """
+    Возвращает число ходов пешки до превращения (в относительных координатах, с учетом хода на два поля).
+    """
+    row = sq >> 3
+    return 5 if row == 6 else row
+
+def is_unstoppable(pawn, defender_king, blockers, defender_to_move):
+    """
+    Правило квадрата: проверяет, что король соперника не догонит пешку и не успеет взять
+    нового ферзя (расстояние до поля превращения больше числа ходов пешки).
+    
+    :param pawn: Клетка пешки (в относительных координатах).
+    :param defender_king: Клетка короля соперника.
+    :param blockers: Клетки остальных фигур, которые могут загородить путь пешки.
+    :param defender_to_move: Флаг, указывающий, что ход соперника.
+    :return: True, если пешка беспрепятственно проходит в ферзи.
+    """
+    row, col = divmod(pawn, 8)
+    if any(square(r, col) in blockers for r in range(row)):
+        return False
+    return distance(defender_king, col) - defender_to_move > moves_to_queen(pawn)
+
+def key_squares(pawn):
+    """
+    Возвращает ключевые поля пешки (не крайней): если король сильнейшей стороны стоит
+    на ключевом поле, пешка проходит в ферзи при любой очереди хода.
+    
+    :param pawn: Клетка пешки (в относительных координатах).
+    :return: Множество клеток.
+    """
+    row, col = divmod(pawn, 8)
+    if row >= 4:
+        rows = (row - 2,)
+    elif row >= 2:
+        rows = (row - 1, row - 2)
+    else:
+        rows = (row, row - 1)
+    return {square(r, c) for r in rows for c in (col - 1, col, col + 1) if 0 <= c < 8}
+
+def kpk_verdict(pawn, king, defender, attacker_to_move):
+    """
+    Оценивает эндшпиль «король и пешка против короля» по правилам.
+    
+    :param pawn: Клетка пешки (в относительных координатах сильнейшей стороны).
+    :param king: Клетка короля сильнейшей стороны.
+    :param defender: Клетка короля соперника.
+    :param attacker_to_move: Флаг, указывающий, что ход сильнейшей стороны.
+    :return: 1 — выигрыш, 0 — ничья, None — правила не дают ответа.
+    """
+    defender_to_move = not attacker_to_move
+    row, col = divmod(pawn, 8)
+    if defender_to_move and distance(defender, pawn) == 1 and distance(king, pawn) > 1:
+        return 0  # Незащищенная пешка будет взята
+    if is_unstoppable(pawn, defender, {king}, defender_to_move):
+        return 1
+    front = pawn - 8
+    if col in (0, 7):
+        # Король соперника впереди крайней пешки или в углу превращения удерживает ничью
+        if (defender & 7) == col and (defender >> 3) < row:
+            return 0
+        if defender >> 3 <= 1 and abs((defender & 7) - col) <= 1:
+            return 0
+        return None
+    keys = key_squares(pawn)
+    if king in keys and not (defender_to_move and defender in (0, 7)):
+        return 1  # Король в углу при коневой пешке может получить пат, это исключение
+    if king == front and defender == front - 16 and row >= 4:
+        return 1 if defender_to_move else 0  # Оппозиция: выигрывает тот, кто ее имеет
+    if defender == front and row >= 2:
+        return 0  # Блокада: король соперника прямо перед пешкой
+    if defender == front - 8 and row >= 3 and king != front:
+        return 0
+    return None
+
+def stops_pawn(pawn, moves_left):
+    """
+    Проверяет, что только что появившийся ферзь останавливает пешку соперника, которой
+    остается moves_left ходов до превращения и которая ходит первой. Против крайней
+    и слоновой пешки на предпоследнем ряду ферзь часто не выигрывает из-за пата,
+    поэтому для них нужен запас в один ход.
+    
+    :param pawn: Клетка пешки соперника.
+    :param moves_left: Число ходов пешки до превращения.
+    :return: True, если ферзь гарантированно выигрывает.
+    """
+    return moves_left >= (3 if (pawn & 7) in (0, 2, 5, 7) else 2)
+
+def race_verdict(pawns, kings, side):
+    """
+    Оценивает гонку пешек в эндшпиле «король и пешка против короля и пешки».
+    
+    Пешка, которую не догоняет король соперника (правило квадрата), проходит в ферзи, и новый
+    ферзь не теряется сразу: король соперника не успевает встать рядом с полем превращения.
+    Если пешке соперника к этому моменту остается достаточно ходов (stops_pawn), выигрывает
+    сторона, первой проведшая ферзя. Если пешки превращаются одна за другой, исход решает
+    перебор позиции «ферзь против ферзя».
+    
+    :param pawns: Клетки пешек белых и черных (в обычных координатах).
+    :param kings: Клетки королей белых и черных.
+    :param side: Сторона, которая ходит.
+    :return: Цвет выигрывающей стороны или None, если гонка не решает исход.
+    """
+    if abs((pawns[WHITE] & 7) - (pawns[BLACK] & 7)) < 2:
+        return None  # Пешки мешают друг другу или могут быть взяты: нужен перебор
+    occupied = set(pawns) | set(kings)
+    for color in (WHITE, BLACK):
+        enemy = color ^ 1
+        pawn = relative(pawns[color], color)
+        if not is_unstoppable(pawn, relative(kings[enemy], color),
+                              {relative(sq, color) for sq in occupied}, side == enemy):
+            continue
+        moves = moves_to_queen(pawn)
+        # Ходы соперника, сделанные до превращения нашей пешки
+        enemy_moves = moves if side == enemy else moves - 1
+        if stops_pawn(pawns[enemy], moves_to_queen(relative(pawns[enemy], enemy)) - enemy_moves):
+            return color
+    return None
+
+def mating_bonus(king, defender):
+    """
+    Возвращает поправку за прижатие одинокого короля к краю и сближение королей.
+    """
+    row, col = divmod(defender, 8)
+    edge = max(abs(2 * row - 7), abs(2 * col - 7)) // 2
+    return 0.5 * edge - 0.1 * distance(king, defender)
+
+def single(bb):
+    """
+    Возвращает клетку единственной фигуры битборда.
+    """
+    return bb.bit_length() - 1
+
+def evaluate_kpk(position, color):
+    """
+    Оценивает позицию «король и пешка против короля» по правилам kpk_verdict.
+    
+    :param position: Позиция (bitboard.Position).
+    :param color: Цвет стороны с пешкой.
+    :return: Оценка с точки зрения белых или None, если правила не дают ответа.
+    """
+    pawn = single(position.pieces[color][PAWN])
+    king = single(position.pieces[color][KING])
+    defender = single(position.pieces[color ^ 1][KING])
+    pawn = relative(pawn, color)
+    verdict = kpk_verdict(pawn, relative(king, color), relative(defender, color), position.side == color)
+    if verdict is None:
+        return None
+    score = verdict * (KNOWN_WIN_SCORE - moves_to_queen(pawn))
+    return score if color == WHITE else -score
+
+def evaluate_kpkp(position):
+    """
+    Оценивает позицию «король и пешка против короля и пешки» по гонке пешек (race_verdict).
+    
+    :param position: Позиция (bitboard.Position).
+    :return: Оценка с точки зрения белых или None, если гонка не решает исход.
+    """
+    pawns = [single(position.pieces[color][PAWN]) for color in (WHITE, BLACK)]
+    kings = [single(position.pieces[color][KING]) for color in (WHITE, BLACK)]
+    winner = race_verdict(pawns, kings, position.side)
+    if winner is None:
+        return None
+    score = KNOWN_WIN_SCORE - moves_to_queen(relative(pawns[winner], winner))
+    return score if winner == WHITE else -score
+
+def evaluate_major(position, color, piece, value):
+    """
+    Оценивает позицию, где у сильнейшей стороны ферзь или ладья против одинокого короля
+    или ферзь против короля с пешкой, которую ферзь успевает остановить.
+    """
+    enemy = color ^ 1
+    major = single(position.pieces[color][piece])
+    king = single(position.pieces[color][KING])
+    defender = single(position.pieces[enemy][KING])
+    if position.side == enemy and distance(defender, major) == 1 and distance(king, major) > 1:
+        return None  # Фигура под боем
+    if position.side == enemy and not position.in_check() and not position.legal_moves():
+        return 0  # Пат
+    pawns = position.pieces[enemy][PAWN]
+    if pawns:
+        pawn = relative(single(pawns), enemy)
+        if not stops_pawn(pawn, moves_to_queen(pawn) + (position.side == color)):
+            return None  # Далеко продвинутая пешка против ферзя может дать ничью
+    score = KNOWN_WIN_SCORE + value + mating_bonus(king, defender)
+    return score if color == WHITE else -score
+
+def _evaluators():
+    # Оценщики по ключу материала; для черных как сильнейшей стороны ключ зеркальный
+    evaluators = {material_key((KING, PAWN), (KING, PAWN)): evaluate_kpkp}
+    for color in (WHITE, BLACK):
+        def key(strong, weak):
+            return material_key(strong, weak) if color == WHITE else material_key(weak, strong)
+        evaluators[key((KING, PAWN), (KING,))] = lambda position, color=color: evaluate_kpk(position, color)
+        evaluators[key((KING, QUEEN), (KING,))] = lambda position, color=color: evaluate_major(position, color, QUEEN, 9)
+        evaluators[key((KING, ROOK), (KING,))] = lambda position, color=color: evaluate_major(position, color, ROOK, 5)
+        evaluators[key((KING, QUEEN), (KING, PAWN))] = (
+            lambda position, color=color: evaluate_major(position, color, QUEEN, 8))
+    return evaluators
+
+EVALUATORS = _evaluators()
+
+def evaluate(position):
+    """
+    Оценивает позицию по знаниям об эндшпиле.
+    
+    :param position: Позиция (bitboard.Position).
+    :return: Оценка с точки зрения белых или None, если знания к позиции не применимы.
+    """
+    evaluator = EVALUATORS.get(position.material)
+    if evaluator is None:
+        return None
+    return evaluator(position)
+
+def verdict(score):
+    """
+    Переводит оценку в результат партии.
+    
+    :param score: Оценка с точки зрения белых или None.
+    :return: '1-0', '0-1', '1/2-1/2' или '?', если оценка не определяет результат.
+    """
+    if score is None:
+        return '?'
+    if score >= KNOWN_WIN_SCORE / 2:
+        return '1-0'
+    if score <= -KNOWN_WIN_SCORE / 2:
+        return '0-1'
+    return '1/2-1/2' if abs(score) < 1 else '?'
+
+def main():
+    parser = argparse.ArgumentParser(description='Проверка знаний об эндшпиле на позициях с известным результатом')
+    parser.add_argument('--depth', type=int, default=3, help='глубина поиска с оценкой по знаниям (по умолчанию 3)')
+    args = parser.parse_args()
+    import ai  # Импорт здесь: ai сам использует этот модуль
+    # Проверяются правила, а не таблицы эндшпиля: поиск не обращается к таблицам и не строит их
+    ai.tablebases.on_demand.clear()
+    ai.tablebases.available.clear()
+
+    failed = 0
+    print(f"{'позиция':<32}{'ожидается':>10}{'оценка':>10}{'поиск':>10}")
+    for name, fen, expected in CORPUS:
+        position = Position.from_fen(fen)
+        static = verdict(evaluate(position))
+        ai.transposition_table.clear()
+        moves = position.legal_moves()
+        if moves:
+            _, value = ai.search_root(position, moves, args.depth, ai.SearchContext())
+        else:
+            value = ai.evaluate_terminal(position)  # Мат или пат: перебирать нечего
+        searched = verdict(value)
+        # Правила обязаны знать результат позиции из списка, а поиск — не противоречить ему
+        # (часть позиций на глубине поиска правилами не покрыта и оценивается обычным способом)
+        ok = static == expected and searched in ('?', expected)
+        failed += not ok
+        print(f"{name:<32}{expected:>10}{static:>10}{searched:>10}{'' if ok else '  ОШИБКА'}")
+    print(f"Расхождений: {failed}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -3,22 +3,75 @@
 import pygame
 import settings  # Импортируем как модуль
 from settings import *
-from copy import deepcopy
 from datetime import datetime
-from database import update_game, get_game_by_id
-import json  # Импортируем json для сериализации ходов
+from database import (update_game, get_game_by_id, get_game_snapshot, get_game_writer, get_moves, get_move_count,
+                      flush_games)
+from bitboard import (Position, EMPTY, MATERIAL_KEYS, ONLY_KINGS_MATERIAL, PIECE_CHARS, ZOBRIST_PIECES,
+                      ZOBRIST_SIDE, board_from_fen, board_to_fen, piece_code_from_name, square)
 
 class Move:
     """
     Класс, представляющий ход в шахматах.
+    
+    Клетки и фигура превращения упакованы в одно число code в той же кодировке, что и ходы
+    bitboard.Position: from | to << 6 | promotion << 12 (номер клетки — row * 8 + col,
+    фигура превращения — индекс в PIECE_CHARS, 0 — без превращения). Объекты занимают мало
+    памяти (__slots__), сравниваются по трем полям и могут быть элементами множеств и ключами словарей.
     """
+    __slots__ = ('code', 'piece_moved', 'piece_captured')
+
     def __init__(self, start_pos, end_pos, piece_moved, piece_captured, is_pawn_promotion=False, promotion_choice='Q'):
-        self.start_row, self.start_col = start_pos
-        self.end_row, self.end_col = end_pos
+        code = start_pos[0] * 8 + start_pos[1] | (end_pos[0] * 8 + end_pos[1]) << 6
+        if is_pawn_promotion:
+            code |= PIECE_CHARS.index(promotion_choice or 'Q') << 12
+        self.code = code
         self.piece_moved = piece_moved
         self.piece_captured = piece_captured
-        self.is_pawn_promotion = is_pawn_promotion
-        self.promotion_choice = promotion_choice
+
+    @classmethod
+    def from_code(cls, code, piece_moved, piece_captured):
+        """
+        Создает ход из упакованного числа (например, хода bitboard.Position).
+        
+        :param code: Упакованный ход.
+        :param piece_moved: Фигура, которая ходит ('wP', 'bK', ...).
+        :param piece_captured: Взятая фигура или '--'.
+        :return: Объект Move.
+        """
+        move = cls.__new__(cls)
+        move.code = code
+        move.piece_moved = piece_moved
+        move.piece_captured = piece_captured
+        return move
+
+    @property
+    def start_row(self):
+        return (self.code & 63) >> 3
+
+    @property
+    def start_col(self):
+        return self.code & 7
+
+    @property
+    def end_row(self):
+        return (self.code >> 9) & 7
+
+    @property
+    def end_col(self):
+        return (self.code >> 6) & 7
+
+    @property
+    def is_pawn_promotion(self):
+        return self.code >> 12 != 0
+
+    @property
+    def promotion_choice(self):
+        return PIECE_CHARS[self.code >> 12] if self.code >> 12 else 'Q'
+
+    @property
+    def is_irreversible(self):
+        # Ход пешкой или взятие: позиции до этого хода повториться уже не могут
+        return self.piece_moved[1] == 'P' or self.piece_captured != '--'
 
     def __eq__(self, other):
         """
@@ -28,16 +81,14 @@ class Move:
         :return: True, если ходы равны, иначе False.
         """
         if isinstance(other, Move):
-            return (self.start_row == other.start_row and
-                    self.start_col == other.start_col and
-                    self.end_row == other.end_row and
-                    self.end_col == other.end_col and
+            return (self.code == other.code and
                     self.piece_moved == other.piece_moved and
-                    self.piece_captured == other.piece_captured and
-                    self.is_pawn_promotion == other.is_pawn_promotion and
-                    self.promotion_choice == other.promotion_choice)
+                    self.piece_captured == other.piece_captured)
         return False
 
+    def __hash__(self):
+        return hash((self.code, self.piece_moved, self.piece_captured))
+
     def get_chess_notation(self):
         """
         Возвращает ход в шахматной нотации.
@@ -81,6 +132,27 @@ class Move:
             promotion_choice=move_dict.get('promotion_choice', 'Q')
         )
 
+    def to_bytes(self):
+        """
+        Кодирует ход в два байта (упакованное число code) для хранения в базе данных.
+        
+        :return: Два байта хода.
+        """
+        return self.code.to_bytes(2, 'little')
+
+    @classmethod
+    def from_bytes(cls, data, board):
+        """
+        Создает объект Move из двух байтов to_bytes. Фигуры берутся с доски до хода.
+        
+        :param data: Два байта хода.
+        :param board: Доска в позиции перед ходом.
+        :return: Объект Move.
+        """
+        code = int.from_bytes(data, 'little')
+        start, end = code & 63, (code >> 6) & 63
+        return cls.from_code(code, board[start >> 3][start & 7], board[end >> 3][end & 7])
+
 class Game:
     """
     Класс, представляющий шахматную партию.
@@ -94,7 +166,11 @@ class Game:
         else:
             self.board = self.create_initial_board()  # Создание начальной доски
             self.white_to_move = True
-            self.move_log = []
+            self.reset_position_keys()
+            self.recent_moves = []  # Ходы партии после первых unloaded_plies, не прочитанных из базы (см. move_log)
+            self.unloaded_plies = 0
+            self.halfmove_clock = 0  # Число полуходов после последнего хода пешкой или взятия
+            self.saved_plies = 0  # Число первых ходов move_log, уже записанных в базу данных
             self.selected_square = None
             self.valid_moves = []
             self.checkmate = False
@@ -105,7 +181,8 @@ class Game:
             self.end_time = None
             self.result = None
 
-    def create_initial_board(self):
+    @staticmethod
+    def create_initial_board():
         """
         Создает начальную расстановку фигур на доске.
         
@@ -125,24 +202,47 @@ class Game:
         
         :param game_id: ID партии.
         """
+        flush_games()  # Отложенные сохранения партии должны попасть в базу до чтения
         game = get_game_by_id(game_id)
         if game:
             _, white_player, black_player, moves, result, start_time, end_time, status = game
             self.white_player = white_player
             self.black_player = black_player
-            self.move_log = [Move.from_dict(move_dict) for move_dict in json.loads(moves)]
-            self.reconstruct_board()
             self.result = result
             self.start_time = start_time
             self.end_time = end_time
-            self.checkmate = status == 'completed' and ('checkmate' in (result.lower()) if result else False)
-            self.stalemate = status == 'completed' and ('stalemate' in (result.lower()) if result else False)
-            self.white_to_move = len(self.move_log) % 2 == 0
+            snapshot = get_game_snapshot(game_id)
+            if snapshot and snapshot[1] == get_move_count(game_id):
+                # Позиция берется из снимка, записанного вместе с последним ходом, без воспроизведения партии;
+                # ходы партии читаются из базы, только когда они понадобятся (move_log)
+                position_fen, plies, position_state = snapshot
+                self.recent_moves = []
+                self.unloaded_plies = plies
+                self.board, self.white_to_move = board_from_fen(position_fen)
+                fields = position_fen.split()
+                self.halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+                self.restore_position_keys()
+                self.checkmate = position_state == 'checkmate'
+                self.stalemate = position_state == 'stalemate'
+                if settings.VERIFY_GAME_SNAPSHOTS:
+                    self.verify_snapshot()
+            else:
+                # Снимка нет (партия сохранена до их появления): позиция восстанавливается по ходам
+                self.recent_moves = self.decode_moves(get_moves(game_id))
+                self.unloaded_plies = 0
+                self.reconstruct_board()
+                self.checkmate = status == 'completed' and ('checkmate' in (result.lower()) if result else False)
+                self.stalemate = status == 'completed' and ('stalemate' in (result.lower()) if result else False)
+            self.saved_plies = self.ply_count
         else:
             print(f"Игра с ID {game_id} не найдена.")
             self.board = self.create_initial_board()
             self.white_to_move = True
-            self.move_log = []
+            self.reset_position_keys()
+            self.recent_moves = []  # Ходы партии после первых unloaded_plies, не прочитанных из базы (см. move_log)
+            self.unloaded_plies = 0
+            self.halfmove_clock = 0  # Число полуходов после последнего хода пешкой или взятия
+            self.saved_plies = 0  # Число первых ходов move_log, уже записанных в базу данных
             self.selected_square = None
             self.valid_moves = []
             self.checkmate = False
@@ -153,17 +253,85 @@ class Game:
             self.end_time = None
             self.result = None
 
+    @property
+    def move_log(self):
+        """
+        Ходы партии (объекты Move). У партии, загруженной из снимка, ходы до снимка читаются
+        из базы данных только при первом обращении (отмена хода, экспорт PGN, проверка снимка).
+        """
+        if self.unloaded_plies:
+            self.recent_moves = self.decode_moves(get_moves(self.game_id, 0, self.unloaded_plies)) + self.recent_moves
+            self.unloaded_plies = 0
+        return self.recent_moves
+
+    @property
+    def ply_count(self):
+        """
+        Число полуходов партии (без чтения ходов из базы данных).
+        """
+        return self.unloaded_plies + len(self.recent_moves)
+
     def reconstruct_board(self):
         """
-        Восстанавливает доску на основе истории ходов.
+        Восстанавливает доску и ключи позиций на основе истории ходов.
         """
         self.board = self.create_initial_board()
+        self.white_to_move = True
+        self.reset_position_keys()
+        self.halfmove_clock = 0
         for move in self.move_log:
             self.board[move.start_row][move.start_col] = '--'
             self.board[move.end_row][move.end_col] = move.piece_moved
             if move.is_pawn_promotion:
                 self.board[move.end_row][move.end_col] = move.piece_moved[0] + move.promotion_choice
-                print(f"Пешка превращена в {self.board[move.end_row][move.end_col]} на позиции {(move.end_row, move.end_col)}")
+            self.white_to_move = not self.white_to_move
+            self.halfmove_clock = 0 if move.is_irreversible else self.halfmove_clock + 1
+            self.push_position_key(move)
+
+    def verify_snapshot(self):
+        """
+        Сверяет позицию, восстановленную из снимка, с воспроизведением ходов партии.
+        При расхождении остается позиция, полученная воспроизведением.
+        
+        :return: True, если снимок совпадает с ходами, иначе False.
+        """
+        board, white_to_move = self.board, self.white_to_move
+        self.reconstruct_board()
+        if board != self.board or white_to_move != self.white_to_move:
+            print(f"Снимок позиции партии {self.game_id} не совпадает с ходами, позиция восстановлена по ходам.")
+            return False
+        return True
+
+    @staticmethod
+    def decode_moves(records):
+        """
+        Восстанавливает ходы партии из записей базы данных: словарей Move.to_dict (прежний формат)
+        или двухбайтовых кодов Move.to_bytes, фигуры которых определяются по ходу партии
+        с начальной позиции.
+        
+        :param records: Записи ходов по порядку полуходов.
+        :return: Список объектов Move.
+        """
+        board = Game.create_initial_board()
+        moves = []
+        for record in records:
+            move = Move.from_dict(record) if isinstance(record, dict) else Move.from_bytes(record, board)
+            board[move.start_row][move.start_col] = '--'
+            if move.is_pawn_promotion:
+                board[move.end_row][move.end_col] = move.piece_moved[0] + move.promotion_choice
+            else:
+                board[move.end_row][move.end_col] = move.piece_moved
+            moves.append(move)
+        return moves
+
+    def encode_move(self, move):
+        """
+        Кодирует ход для записи в базу данных в формате settings.MOVE_STORAGE_FORMAT.
+        
+        :param move: Ход (объект Move).
+        :return: Два байта ('binary') или словарь Move.to_dict ('json').
+        """
+        return move.to_bytes() if settings.MOVE_STORAGE_FORMAT == 'binary' else move.to_dict()
 
     def make_move(self, move, update_state=True):
         """
@@ -174,41 +342,154 @@ class Game:
         """
         self.board[move.start_row][move.start_col] = '--'
         self.board[move.end_row][move.end_col] = move.piece_moved
-        self.move_log.append(move)
+        self.recent_moves.append(move)  # Без чтения из базы ходов, еще не загруженных из нее
         self.white_to_move = not self.white_to_move
+        self.halfmove_clock = 0 if move.is_irreversible else self.halfmove_clock + 1
         if move.is_pawn_promotion:
             # Используйте выбранную фигуру
             promotion_choice = move.promotion_choice if move.promotion_choice else 'Q'
             self.board[move.end_row][move.end_col] = move.piece_moved[0] + promotion_choice
-            print(f"Пешка превращена в {self.board[move.end_row][move.end_col]} на позиции {(move.end_row, move.end_col)}")
+        self.push_position_key(move)
         if update_state:
             self.check_game_state()
             self.save_current_game()
 
-    def undo_move(self):
+    def undo_move(self, update_state=True):
         """
         Отменяет последний ход.
+        
+        :param update_state: Флаг, указывающий, нужно ли обновлять состояние игры и сохранять партию.
         """
-        if self.move_log:
+        if self.ply_count:
             move = self.move_log.pop()
+            self.saved_plies = min(self.saved_plies, len(self.move_log))
+            if self.halfmove_clock:
+                self.halfmove_clock -= 1
+            else:
+                # Отменен ход пешкой или взятие: счетчик считается по предыдущим ходам
+                for earlier in reversed(self.move_log):
+                    if earlier.is_irreversible:
+                        break
+                    self.halfmove_clock += 1
             self.board[move.start_row][move.start_col] = move.piece_moved
             self.board[move.end_row][move.end_col] = move.piece_captured
             self.white_to_move = not self.white_to_move
-            self.check_game_state()
-            self.save_current_game()
+            self.position_keys.pop()
+            if not self.position_keys:
+                # История ключей, восстановленная из снимка, закончилась: ключи считаются по доске
+                self.reset_position_keys()
+            self.position_cache.clear()
+            if update_state:
+                self.check_game_state()
+                self.save_current_game()
+
+    def reset_position_keys(self):
+        """
+        Вычисляет ключи текущей позиции с нуля и начинает с нее историю ключей позиций.
+        """
+        position = Position.from_board(self.board, self.white_to_move)
+        self.position_keys = [(position.hash, position.material)]
+        # Допустимые ходы и шах текущей позиции по ключу Зобриста; очищается при каждом ходе и его отмене
+        self.position_cache = {}
+
+    def restore_position_keys(self):
+        """
+        Восстанавливает историю ключей позиций без воспроизведения партии: от текущей позиции
+        ключи вычисляются назад по последним halfmove_clock ходам, сделанным после последнего хода
+        пешкой или взятия (более ранние позиции повториться уже не могут). Из базы данных
+        читаются только эти ходы.
+        """
+        self.reset_position_keys()
+        key, material = self.position_keys[0]
+        keys = [(key, material)]
+        board = [row[:] for row in self.board]
+        records = list(get_moves(self.game_id, self.ply_count - self.halfmove_clock, self.ply_count))
+        for record in reversed(records):
+            if isinstance(record, dict):
+                move = Move.from_dict(record)
+            else:
+                # Ход без взятия: фигура стоит на конечной клетке, начальная до хода пуста
+                code = int.from_bytes(record, 'little')
+                end = (code >> 6) & 63
+                move = Move.from_code(code, board[end >> 3][end & 7], '--')
+            if move.is_irreversible:
+                break
+            board[move.start_row][move.start_col] = move.piece_moved
+            board[move.end_row][move.end_col] = '--'
+            moved = ZOBRIST_PIECES[piece_code_from_name(move.piece_moved)]
+            key ^= ZOBRIST_SIDE ^ moved[square(move.start_row, move.start_col)] ^ moved[square(move.end_row, move.end_col)]
+            keys.append((key, material))
+        keys.reverse()
+        self.position_keys = keys
+
+    def push_position_key(self, move):
+        """
+        Добавляет в историю ключи позиции после хода (доска уже изменена): ключ Зобриста
+        и ключ материала обновляются по изменившимся клеткам, без просмотра всей доски.
+        
+        :param move: Выполненный ход (объект Move).
+        """
+        start = square(move.start_row, move.start_col)
+        end = square(move.end_row, move.end_col)
+        moved = piece_code_from_name(move.piece_moved)
+        placed = piece_code_from_name(self.board[move.end_row][move.end_col])  # С учетом превращения
+        captured = piece_code_from_name(move.piece_captured)
+        key, material = self.position_keys[-1]
+        key ^= ZOBRIST_SIDE ^ ZOBRIST_PIECES[moved][start] ^ ZOBRIST_PIECES[placed][end]
+        material += MATERIAL_KEYS[placed] - MATERIAL_KEYS[moved]
+        if captured != EMPTY:
+            key ^= ZOBRIST_PIECES[captured][end]
+            material -= MATERIAL_KEYS[captured]
+        self.position_keys.append((key, material))
+        self.position_cache.clear()
+
+    def cached_position(self):
+        """
+        Возвращает кэш текущей позиции (словарь, который заполняют get_valid_moves,
+        is_move_valid и in_check).
+        
+        :return: Словарь с вычисленными значениями для текущей позиции.
+        """
+        return self.position_cache.setdefault(self.position_keys[-1][0], {})
 
     def get_valid_moves(self):
         """
-        Возвращает список допустимых ходов для текущего игрока.
+        Возвращает список допустимых ходов для текущего игрока. Список вычисляется один раз
+        для позиции и не должен изменяться вызывающим кодом.
         
         :return: Список допустимых ходов.
         """
-        moves = self.get_all_possible_moves()
+        cache = self.cached_position()
+        moves = cache.get('moves')
+        if moves is None:
+            moves = cache['moves'] = self.filter_legal_moves(self.get_all_possible_moves())
+        return moves
+
+    def filter_legal_moves(self, moves):
+        """
+        Отбирает ходы, после которых король текущего игрока не остается под шахом.
+        Каждый ход выполняется и отменяется прямо на доске, без копирования объекта игры.
+        
+        :param moves: Список ходов без учета шаха.
+        :return: Список допустимых ходов.
+        """
+        ally_color = 'w' if self.white_to_move else 'b'
+        king_pos = self.find_king(ally_color)
+        if king_pos is None:
+            # Король отсутствует, считается, что игрок находится под шахом
+            return []
+        board = self.board
         valid_moves = []
         for move in moves:
-            game_copy = deepcopy(self)
-            game_copy.make_move(move, update_state=False)
-            if not game_copy.in_check(not self.white_to_move):
+            board[move.start_row][move.start_col] = '--'
+            board[move.end_row][move.end_col] = move.piece_moved
+            if move.piece_moved[1] == 'K':
+                is_safe = not self.is_square_under_attack(move.end_row, move.end_col, ally_color)
+            else:
+                is_safe = not self.is_square_under_attack(king_pos[0], king_pos[1], ally_color)
+            board[move.start_row][move.start_col] = move.piece_moved
+            board[move.end_row][move.end_col] = move.piece_captured
+            if is_safe:
                 valid_moves.append(move)
         return valid_moves
 
@@ -407,9 +688,7 @@ class Game:
             if 0 <= end_row < 8 and 0 <= end_col < 8:
                 target = self.board[end_row][end_col]
                 if target == '--' or target[0] != ally_color:
-                    # Проверка, не находится ли конечная клетка под атакой противника
-                    if not self.is_square_under_attack(end_row, end_col, ally_color):
-                        moves.append(Move((r, c), (end_row, end_col), self.board[r][c], target))
+                    moves.append(Move((r, c), (end_row, end_col), self.board[r][c], target))
 
     def is_square_under_attack(self, row, col, ally_color):
         """
@@ -423,7 +702,7 @@ class Game:
         enemy_color = 'b' if ally_color == 'w' else 'w'
 
         # Проверка атакующих пешек
-        direction = -1 if enemy_color == 'w' else 1
+        direction = 1 if enemy_color == 'w' else -1  # белая пешка бьёт клетку с ряда row+1
         for dc in [-1, 1]:
             r = row + direction
             c = col + dc
@@ -499,20 +778,40 @@ class Game:
         :param white_to_move: Флаг, указывающий, ходят ли белые.
         :return: True, если король под шахом, иначе False.
         """
-        king_pos = None
-        for r in range(8):
-            for c in range(8):
-                piece = self.board[r][c]
-                if piece != '--' and piece[0] == ('w' if white_to_move else 'b') and piece[1] == 'K':
-                    king_pos = (r, c)
-                    break
-            if king_pos:
-                break
+        if white_to_move == self.white_to_move:
+            cache = self.cached_position()
+            if 'in_check' not in cache:
+                cache['in_check'] = self.is_king_attacked(white_to_move)
+            return cache['in_check']
+        return self.is_king_attacked(white_to_move)
+
+    def is_king_attacked(self, white_to_move):
+        """
+        Проверяет по доске, атакован ли король указанного цвета (без кэша).
+        
+        :param white_to_move: True для белого короля, False для черного.
+        :return: True, если король под шахом или отсутствует, иначе False.
+        """
+        king_pos = self.find_king('w' if white_to_move else 'b')
         if king_pos is None:
             # Король отсутствует, считается, что игрок находится под шахом
             return True
         return self.is_square_under_attack(king_pos[0], king_pos[1], 'w' if white_to_move else 'b')
 
+    def find_king(self, color):
+        """
+        Находит короля указанного цвета.
+        
+        :param color: Цвет короля ('w' или 'b').
+        :return: Кортеж (ряд, колонка) или None, если короля нет на доске.
+        """
+        king = color + 'K'
+        for r in range(8):
+            row = self.board[r]
+            if king in row:
+                return r, row.index(king)
+        return None
+
     def check_game_state(self):
         """
         Проверяет состояние игры (шах, мат, пат) и обновляет соответствующие флаги.
@@ -545,52 +844,48 @@ class Game:
 
     def is_only_kings(self):
         """
-        Проверяет, остались ли на доске только короли.
+        Проверяет, остались ли на доске только короли (по ключу материала текущей позиции).
         
         :return: True, если на доске только короли, иначе False.
         """
-        return all(piece == '--' or piece[1] == 'K' for row in self.board for piece in row)
+        return self.position_keys[-1][1] == ONLY_KINGS_MATERIAL
 
     def update_game_status(self, status):
         """
-        Обновляет статус партии в базе данных.
+        Обновляет статус партии в базе данных. При SAVE_WRITE_BEHIND запись выполняется
+        в фоновом потоке; завершенная партия записывается сразу (с ожиданием записи).
         
         :param status: Новый статус партии ('in_progress' или 'completed').
         """
         if self.game_id:
-            update_game(
+            save = get_game_writer().update_game if settings.SAVE_WRITE_BEHIND else update_game
+            save(
                 game_id=self.game_id,
-                moves=[move.to_dict() for move in self.move_log],
+                first_ply=self.saved_plies,
+                moves=[self.encode_move(move) for move in self.recent_moves[self.saved_plies - self.unloaded_plies:]],
                 result=self.result,
                 end_time=self.end_time,
-                status=status
+                status=status,
+                position_fen=board_to_fen(self.board, self.white_to_move, self.halfmove_clock),
+                position_state='checkmate' if self.checkmate else 'stalemate' if self.stalemate else None
             )
+            self.saved_plies = self.ply_count
+            if status == 'completed':
+                flush_games()
 
     def save_current_game(self):
         """
-        Сохраняет текущее состояние партии в базе данных.
+        Сохраняет текущее состояние партии в базе данных: записываются только ходы,
+        которых там еще нет (обычно один), и удаляются отмененные.
         """
-        if self.game_id:
-            update_game(
-                game_id=self.game_id,
-                moves=[move.to_dict() for move in self.move_log],
-                result=self.result,
-                end_time=self.end_time,
-                status='completed' if self.result else 'in_progress'
-            )
+        self.update_game_status('completed' if self.result else 'in_progress')
 
     def save_game_completion(self):
         """
         Сохраняет завершенную партию в базе данных и экспортирует её в PGN.
         """
         if self.game_id and self.result:
-            update_game(
-                game_id=self.game_id,
-                moves=[move.to_dict() for move in self.move_log],
-                result=self.result,
-                end_time=self.end_time,
-                status='completed'
-            )
+            self.update_game_status('completed')
             # Экспорт в PGN
             self.export_pgn()
 
@@ -700,7 +995,11 @@ class Game:
         :param move: Ход (объект Move).
         :return: True, если ход допустим, иначе False.
         """
-        return move in self.get_valid_moves()
+        cache = self.cached_position()
+        move_set = cache.get('move_set')
+        if move_set is None:
+            move_set = cache['move_set'] = frozenset(self.get_valid_moves())
+        return move in move_set
 
     def get_piece_moves(self, r, c):
         """
@@ -717,24 +1016,5 @@ class Game:
             return []
         if not self.white_to_move and piece[0] != 'b':
             return []
-        moves = []
-        piece_type = piece[1]
-        if piece_type == 'K':
-            self.get_king_moves(r, c, moves)
-        elif piece_type == 'P':
-            self.get_pawn_moves(r, c, moves)
-        elif piece_type == 'Q':
-            self.get_queen_moves(r, c, moves)
-        elif piece_type == 'R':
-            self.get_rook_moves(r, c, moves)
-        elif piece_type == 'B':
-            self.get_bishop_moves(r, c, moves)
-        elif piece_type == 'N':
-            self.get_knight_moves(r, c, moves)
-        valid_moves = []
-        for move in moves:
-            game_copy = deepcopy(self)
-            game_copy.make_move(move, update_state=False)
-            if not game_copy.in_check(not self.white_to_move):
-                valid_moves.append(move)
-        return valid_moves
+        # Ходы фигуры берутся из допустимых ходов позиции, вычисленных один раз
+        return [move for move in self.get_valid_moves() if move.start_row == r and move.start_col == c]
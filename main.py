@@ -3,13 +3,12 @@
 import pygame
 import sys
 import os
-import json  # Добавлен импорт json
 import settings  # Исправлено: импортируем как модуль
 from settings import *
 from auth import login, register
-from database import initialize_db, get_games_by_user, create_new_game, get_game_by_id
+from database import initialize_db, get_games_by_user, create_new_game, get_game_by_id, get_moves, flush_games
 from game import Game, Move
-from ai import find_best_move
+from ai import AIWorker
 
 pygame.init()
 pygame.display.set_caption('Шахматный Эндшпиль: Король и Пешка - Король и Пешка')
@@ -360,7 +359,7 @@ def show_game_details(game):
     :param game: Данные партии.
     """
     game_id, white_player, black_player, moves, result, start_time, end_time, status = game
-    moves_list = json.loads(moves)  # Преобразование JSON строки обратно в список
+    moves_list = Game.decode_moves(get_moves(game_id))
     while True:
         screen.fill(BLACK)
         draw_text(screen, f'Партия ID: {game_id}', 40, WHITE, settings.WINDOW_WIDTH//2 - 100, 50)
@@ -389,6 +388,16 @@ def show_game_details(game):
                     return
         clock.tick(FPS)
 
+def ai_search_limits():
+    """
+    Возвращает ограничения поиска ИИ из настроек: время на ход или фиксированную глубину.
+    
+    :return: Словарь с параметрами depth и time_limit_ms для AIWorker.
+    """
+    if settings.AI_TIME_LIMIT_MS:
+        return {'depth': None, 'time_limit_ms': settings.AI_TIME_LIMIT_MS}
+    return {'depth': settings.AI_DEPTH, 'time_limit_ms': None}
+
 def game_screen_instance(game_instance):
     """
     Основной игровой экран, где происходит управление партией.
@@ -399,18 +408,39 @@ def game_screen_instance(game_instance):
     valid_moves = []
     run = True
     paused = False
+    # ИИ думает в фоновом потоке, пока игровой цикл продолжает отрисовку и обработку событий
+    ai_worker = AIWorker()
+    thinking = False
+    if (isinstance(game_instance.black_player, str) and
+        game_instance.black_player.lower() == 'ai' and
+        not game_instance.white_to_move and
+        not game_instance.checkmate and
+        not game_instance.stalemate):
+        # Партия сохранена, пока ИИ думал: поиск отменен, ход ИИ нужно запросить заново
+        ai_worker.request_move(game_instance, **ai_search_limits())
+        thinking = True
 
     while run:
+        if thinking and not ai_worker.results.empty():
+            ai_move = ai_worker.results.get()
+            thinking = False
+            if ai_move:
+                game_instance.make_move(ai_move)
+                if settings.AI_PONDER and not game_instance.checkmate and not game_instance.stalemate:
+                    # Пока человек думает, ИИ обдумывает ответ на его ожидаемый ход
+                    ai_worker.ponder(game_instance, **ai_search_limits())
+
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 run = False
+                ai_worker.close()
                 pygame.quit()
                 sys.exit()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_p:
                     paused = not paused
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if not paused and not game_instance.checkmate and not game_instance.stalemate:
+                if not paused and not thinking and not game_instance.checkmate and not game_instance.stalemate:
                     pos = pygame.mouse.get_pos()
                     row, col = pos[1] // settings.CELL_SIZE, pos[0] // settings.CELL_SIZE
                     piece = game_instance.board[row][col]
@@ -432,9 +462,8 @@ def game_screen_instance(game_instance):
                                 not game_instance.white_to_move and
                                 not game_instance.checkmate and
                                 not game_instance.stalemate):
-                                ai_move = find_best_move(game_instance, depth=settings.AI_DEPTH)
-                                if ai_move:
-                                    game_instance.make_move(ai_move)
+                                ai_worker.request_move(game_instance, **ai_search_limits())
+                                thinking = True
                         else:
                             # Если ход некорректен, сбрасываем выбор
                             if piece != '--' and ((game_instance.white_to_move and piece[0] == 'w') or (not game_instance.white_to_move and piece[0] == 'b')):
@@ -451,6 +480,9 @@ def game_screen_instance(game_instance):
         if not paused:
             screen.fill(BLACK)
             game_instance.draw(screen, images, selected_square, valid_moves)
+            if thinking:
+                # Внизу слева: вверху слева game.draw выводит «Шах!»
+                draw_text(screen, 'ИИ думает...', 30, RED, 10, settings.WINDOW_HEIGHT - 40)
         else:
             # Показать паузу
             screen.fill(GRAY)
@@ -461,11 +493,13 @@ def game_screen_instance(game_instance):
             # Проверка событий в паузе
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
+                    ai_worker.close()
                     pygame.quit()
                     sys.exit()
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_s:
-                        # Сохранить и выйти в главное меню
+                        # Сохранить и выйти в главное меню (незавершенный поиск ИИ отменяется)
+                        flush_games()
                         run = False
                     elif event.key == pygame.K_p:
                         paused = False
@@ -482,6 +516,8 @@ def game_screen_instance(game_instance):
             if game_instance.result:
                 game_instance.save_game_completion()
 
+    ai_worker.close()
+
 def game_screen(mode, white_player='White', black_player='AI'):
     """
     Создает новую партию или загружает существующую и запускает игровой экран.
@@ -0,0 +1,147 @@
+# perft.py
+
+"""
+Perft: подсчет числа позиций в дереве ходов до заданной глубины.
+
+Проверяет правильность и измеряет скорость генератора ходов. Числа узлов сверяются с эталонными
+значениями из POSITIONS (при расхождении программа завершается с кодом 1), поэтому каждую
+оптимизацию генератора ходов нужно проверять этой командой.
+
+Запуск: python perft.py [--depth N] [--backend bitboard|game] [--position ИМЯ ...] [--json]
+"""
+
+import argparse
+import json
+import sys
+import time
+from bitboard import Position, board_from_fen
+
+# Позиции эндшпиля «король и пешка» и позиции с превращениями:
+# (имя, FEN, эталонные числа узлов для глубин 1, 2, ...).
+# Числа совпадают у генераторов Game и bitboard.Position; для 'capture promotion'
+# они совпадают и с общеизвестными значениями perft этой позиции.
+POSITIONS = [
+    ('kpkp start', '4k3/7p/8/8/8/8/P7/4K3 w - - 0 1', (7, 49, 392, 3136, 26219, 216714)),
+    ('opposition', '8/8/8/4k3/8/4K3/4P3/8 w - - 0 1', (4, 28, 226, 1598, 12554, 90618)),
+    ('pawn race', '8/7p/8/2k5/8/5K2/P7/8 w - - 0 1', (10, 95, 892, 8109, 69096, 599284)),
+    ('blocked pawns', '8/8/3k4/3p4/3P4/3K4/8/8 w - - 0 1', (5, 25, 180, 1294, 8296, 53138, 345129)),
+    ('promotion', '8/P6k/8/8/8/8/6Kp/8 w - - 0 1', (11, 87, 883, 8392, 109311)),
+    ('double promotion', '8/PPP4k/8/8/8/8/4Kppp/8 w - - 0 1', (18, 290, 5044, 89363)),
+    ('capture promotion', 'n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1', (24, 496, 9483, 182838)),
+]
+
+def perft_position(position, depth):
+    """
+    Считает число позиций на глубине depth генератором bitboard.Position.
+    
+    :param position: Позиция (bitboard.Position).
+    :param depth: Глубина.
+    :return: Число позиций.
+    """
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        position.push(move)
+        nodes += perft_position(position, depth - 1)
+        position.pop()
+    return nodes
+
+def perft_game(game, depth):
+    """
+    Считает число позиций на глубине depth генератором Game.get_valid_moves.
+    
+    :param game: Объект игры.
+    :param depth: Глубина.
+    :return: Число позиций.
+    """
+    moves = game.get_valid_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game.make_move(move, update_state=False)
+        nodes += perft_game(game, depth - 1)
+        game.undo_move(update_state=False)
+    return nodes
+
+def game_from_fen(fen):
+    """
+    Создает объект игры с позицией из строки FEN (без обращения к базе данных).
+    
+    :param fen: Строка FEN.
+    :return: Объект Game.
+    """
+    from game import Game  # Импорт здесь: генератору bitboard не нужен pygame
+    game = Game()
+    game.board, game.white_to_move = board_from_fen(fen)
+    game.reset_position_keys()
+    return game
+
+# Генераторы ходов: функция создания позиции из FEN и функция perft
+BACKENDS = {
+    'bitboard': (Position.from_fen, perft_position),
+    'game': (game_from_fen, perft_game),
+}
+
+def run_perft(backend, depth, names=None):
+    """
+    Выполняет perft для позиций POSITIONS на глубинах от 1 до depth.
+    
+    :param backend: Имя генератора ходов из BACKENDS.
+    :param depth: Максимальная глубина.
+    :param names: Имена позиций или None для всех позиций.
+    :return: Генератор словарей с результатами по каждой позиции и глубине.
+    """
+    create, perft = BACKENDS[backend]
+    for name, fen, expected_counts in POSITIONS:
+        if names and name not in names:
+            continue
+        for current_depth in range(1, depth + 1):
+            position = create(fen)
+            start = time.perf_counter()
+            nodes = perft(position, current_depth)
+            elapsed = time.perf_counter() - start
+            expected = expected_counts[current_depth - 1] if current_depth <= len(expected_counts) else None
+            yield {
+                'backend': backend,
+                'position': name,
+                'depth': current_depth,
+                'nodes': nodes,
+                'expected': expected,
+                'ok': expected is None or nodes == expected,
+                'seconds': round(elapsed, 6),
+                'nps': round(nodes / elapsed) if elapsed > 0 else None,
+            }
+
+def main():
+    parser = argparse.ArgumentParser(description='Perft: проверка и замер скорости генератора ходов')
+    parser.add_argument('--depth', type=int, default=4, help='максимальная глубина (по умолчанию 4)')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='bitboard')
+    parser.add_argument('--position', nargs='+', metavar='ИМЯ', help='имена позиций из POSITIONS')
+    parser.add_argument('--json', action='store_true', help='выводить результаты по одному JSON-объекту в строке')
+    args = parser.parse_args()
+
+    failed = 0
+    total_nodes = total_seconds = 0
+    if not args.json:
+        print(f"{'позиция':<20}{'глубина':>8}{'узлов':>12}{'эталон':>12}{'время, с':>10}{'узлов/с':>12}")
+    for result in run_perft(args.backend, args.depth, args.position):
+        failed += not result['ok']
+        total_nodes += result['nodes']
+        total_seconds += result['seconds']
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False))
+        else:
+            expected = result['expected'] if result['expected'] is not None else '?'
+            mark = '' if result['ok'] else '  ОШИБКА'
+            print(f"{result['position']:<20}{result['depth']:>8}{result['nodes']:>12}{expected:>12}"
+                  f"{result['seconds']:>10.3f}{result['nps'] or 0:>12}{mark}")
+    if not args.json:
+        print(f"Итого: {total_nodes} узлов за {total_seconds:.2f} с "
+              f"({total_nodes / total_seconds if total_seconds else 0:.0f} узлов/с), расхождений: {failed}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
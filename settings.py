@@ -22,6 +22,31 @@ ASSETS_PATH = os.path.join(os.path.dirname(__file__), 'assets')
 # Глубина поиска AI
 AI_DEPTH = 3
 
+# Ограничение времени на ход AI в миллисекундах (None — поиск на фиксированную глубину AI_DEPTH)
+AI_TIME_LIMIT_MS = 1000
+
+# Обдумывание на время соперника: после своего хода AI ищет ответ на ожидаемый ход человека
+AI_PONDER = True
+
+# Алгоритм поиска AI: 'pvs' (поиск с главным вариантом и окнами аспирации) или 'minimax' (эталонный)
+AI_SEARCH_ALGORITHM = 'pvs'
+
+# Число процессов для параллельного поиска по корневым ходам (1 — поиск в одном процессе)
+AI_WORKERS = 1
+
+# Файл, в который статистика поиска каждого хода ИИ дописывается строкой JSON (None — не записывать)
+AI_STATS_FILE = None
+
+# Формат хранения ходов в базе данных: 'binary' (два байта на ход) или 'json' (словарь Move.to_dict).
+# Партии читаются в любом формате, в том числе со смешанными записями
+MOVE_STORAGE_FORMAT = 'binary'
+
+# Сверять снимок позиции сохраненной партии с воспроизведением ее ходов при загрузке
+VERIFY_GAME_SNAPSHOTS = False
+
+# Отложенная запись партий: сохранение после хода выполняется в фоновом потоке, не задерживая игровой цикл
+SAVE_WRITE_BEHIND = True
+
 # Частота кадров
 FPS = 60
 
@@ -31,3 +56,19 @@ FULLSCREEN = False  # Установите в True для запуска игр
 # Изначальные размеры окна (будут обновлены в main.py при запуске)
 WINDOW_WIDTH = 800
 WINDOW_HEIGHT = 800
+
+# Максимальный объем таблицы транспозиций ИИ в мегабайтах
+TT_SIZE_MB = 16
+
+# Каталог с файлами эндшпильных таблиц (строятся командой python tablebase.py KPKP)
+TABLEBASE_DIR = os.path.join(os.path.dirname(__file__), 'tablebases')
+
+# Окончания, таблицы которых строятся автоматически в фоновом процессе при первом появлении
+# в поиске (вместе с подчиненными окончаниями) и сохраняются в TABLEBASE_DIR. Таблицы
+# с четырьмя фигурами строятся часами, поэтому их нужно строить заранее: python tablebase.py KPKP.
+# Это относится и к окончаниям после превращения KQKP и KQKQ (python tablebase.py KQKP KQKQ): без таблиц
+# KQKP оценивается по знаниям endgame.py, а KQKQ — обычным поиском
+TABLEBASE_ON_DEMAND = ('KPK', 'KQK', 'KRK')
+# Наибольшее суммарное число позиций таблицы и ее недостающих подчиненных таблиц,
+# которые строятся автоматически
+TABLEBASE_MAX_POSITIONS = 40_000_000
@@ -0,0 +1,563 @@
+# tablebase.py
+
+"""
+Эндшпильные таблицы (WDL/DTM), построенные ретроградным анализом.
+
+Таблица хранится в двоичном файле <сигнатура>.tb, по одному знаковому байту на позицию:
+    0      — ничья;
+    n > 0  — сторона, которая ходит, ставит мат за n ходов (2n - 1 полуходов);
+    n < 0  — сторона, которая ходит, получает мат через -n - 1 ходов (2(-n - 1) полуходов);
+    -128   — недопустимая позиция.
+При игре файл открывается через mmap, поэтому обращение к таблице стоит O(1)
+и не требует загрузки всей таблицы в память.
+
+Построение таблиц: python tablebase.py KPKP (недостающие подчиненные таблицы строятся рекурсивно).
+Таблицы из settings.TABLEBASE_ON_DEMAND строятся той же командой в фоновом процессе,
+когда окончание впервые встречается в поиске, если вместе с недостающими подчиненными
+таблицами они не больше settings.TABLEBASE_MAX_POSITIONS позиций.
+"""
+
+import argparse
+import mmap
+import os
+import subprocess
+import sys
+import time
+from array import array
+from collections import defaultdict
+from itertools import product
+
+import settings
+from bitboard import (Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+                      PIECE_CHARS, KING_ATTACKS, KNIGHT_ATTACKS, EMPTY,
+                      rook_attacks, bishop_attacks, iter_bits, move_to, move_promotion)
+
+ILLEGAL = -128
+
+# Порядок фигур в сигнатуре материала: 'KQKP' — белые король и ферзь против черных короля и пешки
+SIGNATURE_ORDER = 'KQRBNP'
+
+# Пешки не могут стоять на первой и последней горизонталях
+PAWN_SQUARES = range(8, 56)
+
+def side_signature(position, color):
+    """
+    Возвращает часть сигнатуры материала для одного цвета (например, 'KP').
+    
+    :param position: Позиция (bitboard.Position).
+    :param color: Цвет.
+    :return: Строка сигнатуры.
+    """
+    return ''.join(char * position.piece_count(color, PIECE_CHARS.index(char)) for char in SIGNATURE_ORDER)
+
+def canonical_signature(white, black):
+    """
+    Приводит сигнатуру к каноническому виду: первой записывается более сильная сторона.
+    Таблица для обратной сигнатуры получается зеркальным отражением доски и сменой цветов.
+    
+    :param white: Сигнатура белых.
+    :param black: Сигнатура черных.
+    :return: Кортеж (каноническая сигнатура, флаг смены цветов).
+    """
+    def strength(side):
+        return len(side), [-SIGNATURE_ORDER.index(char) for char in side]
+    if strength(black) > strength(white):
+        return black + white, True
+    return white + black, False
+
+def normalize_signature(signature):
+    """
+    Приводит сигнатуру, записанную в произвольном порядке сторон (например, 'kpkq'), к канонической.
+    
+    :param signature: Сигнатура материала.
+    :return: Каноническая сигнатура.
+    """
+    signature = signature.upper()
+    split = signature.index('K', 1)
+    return canonical_signature(signature[:split], signature[split:])[0]
+
+def is_trivial_draw(signature):
+    """
+    Проверяет, что материала недостаточно для мата ни одной из сторон (KK, KBK, KNK).
+    
+    :param signature: Каноническая сигнатура.
+    :return: True, если любая позиция с таким материалом — ничья.
+    """
+    return len(signature) <= 3 and not any(char in signature for char in 'QRP')
+
+def encode_result(win, plies):
+    """
+    Кодирует результат позиции в байт таблицы.
+    
+    :param win: True, если сторона, которая ходит, выигрывает.
+    :param plies: Число полуходов до мата.
+    :return: Значение байта таблицы.
+    """
+    if win:
+        return (plies + 1) // 2
+    return -(plies // 2) - 1
+
+def decode_value(value):
+    """
+    Раскодирует байт таблицы.
+    
+    :param value: Значение байта таблицы (не ILLEGAL).
+    :return: Кортеж (результат: 1 — выигрыш, 0 — ничья, -1 — проигрыш, число полуходов до мата).
+    """
+    if value > 0:
+        return 1, 2 * value - 1
+    if value < 0:
+        return -1, 2 * (-value - 1)
+    return 0, 0
+
+def sub_signatures(signature):
+    """
+    Возвращает окончания, в которые переходит окончание после взятия или превращения.
+    
+    :param signature: Каноническая сигнатура.
+    :return: Множество канонических сигнатур.
+    """
+    split = signature.index('K', 1)
+    sides = [signature[:split], signature[split:]]
+    result = set()
+    for i, side in enumerate(sides):
+        for j, char in enumerate(side):
+            if char == 'K':
+                continue
+            changed = list(sides)
+            changed[i] = side[:j] + side[j + 1:]  # Фигура взята
+            result.add(canonical_signature(*changed)[0])
+            if char == 'P':
+                for promoted in 'QRBN':
+                    rest = side[:j] + side[j + 1:] + promoted
+                    changed[i] = ''.join(sorted(rest, key=SIGNATURE_ORDER.index))
+                    result.add(canonical_signature(*changed)[0])
+    return result
+
+def build_plan(signature, available=()):
+    """
+    Возвращает все таблицы, которые придется построить для окончания: само окончание
+    и недостающие подчиненные окончания (рекурсивно), кроме тривиальных ничьих.
+    
+    :param signature: Каноническая сигнатура.
+    :param available: Сигнатуры таблиц, которые уже построены.
+    :return: Множество сигнатур.
+    """
+    plan = set()
+    pending = [signature]
+    while pending:
+        current = pending.pop()
+        if current in plan or current in available or is_trivial_draw(current):
+            continue
+        plan.add(current)
+        pending.extend(sub_signatures(current))
+    return plan
+
+class TableSpec:
+    """
+    Схема индексации таблицы: сторона, которая ходит, и клетки всех фигур сигнатуры.
+    """
+    def __init__(self, signature):
+        """
+        :param signature: Каноническая сигнатура, например 'KPKP'.
+        """
+        split = signature.index('K', 1)
+        self.signature = signature
+        self.pieces = ([(WHITE, PIECE_CHARS.index(char)) for char in signature[:split]] +
+                       [(BLACK, PIECE_CHARS.index(char)) for char in signature[split:]])
+        self.domains = [PAWN_SQUARES if piece == PAWN else range(64) for _, piece in self.pieces]
+        # Шаг индекса при смене клетки каждой фигуры и при смене стороны, которая ходит
+        self.strides = []
+        stride = 1
+        for domain in reversed(self.domains):
+            self.strides.append(stride)
+            stride *= len(domain)
+        self.strides.reverse()
+        self.side_stride = stride
+        self.size = 2 * stride
+
+    def index(self, side, squares):
+        """
+        Вычисляет индекс позиции в таблице.
+        
+        :param side: Сторона, которая ходит.
+        :param squares: Клетки фигур в порядке self.pieces.
+        :return: Индекс позиции.
+        """
+        index = side
+        for domain, sq in zip(self.domains, squares):
+            index = index * len(domain) + sq - domain.start
+        return index
+
+    def decode(self, index):
+        """
+        Восстанавливает сторону, которая ходит, и клетки фигур по индексу.
+        
+        :param index: Индекс позиции.
+        :return: Кортеж (сторона, список клеток).
+        """
+        squares = []
+        for domain in reversed(self.domains):
+            index, offset = divmod(index, len(domain))
+            squares.append(offset + domain.start)
+        squares.reverse()
+        return index, squares
+
+    def squares_of(self, position, flipped):
+        """
+        Возвращает клетки фигур позиции в порядке self.pieces.
+        
+        :param position: Позиция (bitboard.Position).
+        :param flipped: Флаг смены цветов (доска отражается по вертикали).
+        :return: Список клеток.
+        """
+        squares = []
+        taken = {}
+        for color, piece in self.pieces:
+            source = color ^ 1 if flipped else color
+            bits = list(iter_bits(position.pieces[source][piece]))
+            sq = bits[taken.get((color, piece), 0)]
+            taken[(color, piece)] = taken.get((color, piece), 0) + 1
+            squares.append(sq ^ 56 if flipped else sq)
+        return squares
+
+    def position(self, side, squares):
+        """
+        Создает позицию по стороне, которая ходит, и клеткам фигур.
+        
+        :return: Объект Position или None, если фигуры стоят на одной клетке.
+        """
+        if len(set(squares)) != len(squares):
+            return None
+        position = Position()
+        for (color, piece), sq in zip(self.pieces, squares):
+            position.put_piece(color, piece, sq)
+        if side == BLACK:
+            position.side = BLACK
+            position.hash = position.compute_hash()
+        return position
+
+class Tablebases:
+    """
+    Набор эндшпильных таблиц в каталоге. Файлы открываются лениво через mmap.
+    """
+    def __init__(self, directory=None, build_missing=False, on_demand=()):
+        """
+        :param directory: Каталог с файлами таблиц (по умолчанию settings.TABLEBASE_DIR).
+        :param build_missing: Строить отсутствующие таблицы (используется генератором).
+        :param on_demand: Сигнатуры, таблицы которых строятся в фоне при первом обращении.
+        """
+        self.directory = directory or settings.TABLEBASE_DIR
+        self.build_missing = build_missing
+        self.on_demand = {normalize_signature(signature) for signature in on_demand}
+        self.tables = {}
+        self.specs = {}
+        # Ключ материала позиции -> (сигнатура, флаг смены цветов, тривиальная ничья)
+        self.signatures = {}
+        # Процессы, строящие таблицы в фоне, по сигнатурам
+        self.builders = {}
+        # Таблицы, которые строит каждый фоновый процесс (вместе с подчиненными), по сигнатурам
+        self.build_plans = {}
+        # Сигнатуры, построение которых отложено до завершения одного из фоновых процессов
+        self.deferred = set()
+        # Сигнатуры, для которых есть файлы
+        self.available = set()
+        self.scan()
+
+    def scan(self):
+        """
+        Обновляет множество доступных таблиц по содержимому каталога.
+        """
+        if os.path.isdir(self.directory):
+            self.available = {name[:-3] for name in os.listdir(self.directory) if name.endswith('.tb')}
+
+    def request_build(self, signature):
+        """
+        Запускает построение таблицы в фоновом процессе, если оно еще не запущено и вместе
+        с недостающими подчиненными таблицами не превышает settings.TABLEBASE_MAX_POSITIONS.
+        Если часть этих таблиц уже строит другой процесс, запуск откладывается до его завершения.
+        
+        :param signature: Каноническая сигнатура.
+        """
+        if signature in self.builders or signature in self.deferred:
+            return
+        plan = build_plan(signature, self.available)
+        if sum(TableSpec(sub).size for sub in plan) > settings.TABLEBASE_MAX_POSITIONS:
+            self.on_demand.discard(signature)
+            return
+        if any(plan & running for running in self.build_plans.values()):
+            self.deferred.add(signature)  # Повторно проверяется только после завершения процесса
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.builders[signature] = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--directory', self.directory, '--background', signature],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.build_plans[signature] = plan
+
+    def refresh(self):
+        """
+        Подключает таблицы, построение которых в фоне завершилось.
+        """
+        finished = [signature for signature, process in self.builders.items() if process.poll() is not None]
+        if not finished:
+            return
+        for signature in finished:
+            del self.builders[signature]
+            del self.build_plans[signature]
+        self.deferred.clear()
+        self.scan()
+        for signature in finished:
+            if signature not in self.available:
+                self.on_demand.discard(signature)  # Построение не удалось, повторно не запускаем
+        for signature in [sig for sig, table in self.tables.items() if table is None]:
+            del self.tables[signature]
+
+    def path(self, signature):
+        """
+        Возвращает путь к файлу таблицы.
+        """
+        return os.path.join(self.directory, f'{signature}.tb')
+
+    def table(self, signature):
+        """
+        Возвращает отображенный в память файл таблицы или None, если таблицы нет.
+        
+        :param signature: Каноническая сигнатура.
+        """
+        if signature in self.tables:
+            return self.tables[signature]
+        path = self.path(signature)
+        if not os.path.exists(path) and self.build_missing:
+            build_table(signature, self)
+        table = None
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.specs[signature] = TableSpec(signature)
+            self.available.add(signature)
+        self.tables[signature] = table
+        return table
+
+    def probe(self, position):
+        """
+        Ищет позицию в таблицах.
+        
+        :param position: Позиция (bitboard.Position).
+        :return: Значение таблицы (см. описание модуля) или None, если таблицы для материала нет.
+        """
+        entry = self.signatures.get(position.material)
+        if entry is None:
+            signature, flipped = canonical_signature(side_signature(position, WHITE),
+                                                     side_signature(position, BLACK))
+            entry = self.signatures[position.material] = (signature, flipped, is_trivial_draw(signature))
+        signature, flipped, trivial = entry
+        if trivial:
+            return 0
+        if signature not in self.available and not self.build_missing:
+            if signature in self.on_demand:
+                self.request_build(signature)
+            return None
+        table = self.table(signature)
+        if table is None:
+            return None
+        spec = self.specs[signature]
+        side = position.side ^ 1 if flipped else position.side
+        value = table[spec.index(side, spec.squares_of(position, flipped))]
+        return value - 256 if value > 127 else value
+
+    def close(self):
+        """
+        Закрывает все открытые файлы таблиц и останавливает фоновые построения.
+        """
+        for process in self.builders.values():
+            if process.poll() is None:
+                process.terminate()
+        self.builders.clear()
+        self.build_plans.clear()
+        self.deferred.clear()
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables.clear()
+
+def unmove_origins(piece, color, sq, occupied):
+    """
+    Возвращает клетки, с которых фигура могла прийти на sq тихим ходом (без взятия и превращения).
+    
+    :param piece: Тип фигуры.
+    :param color: Цвет фигуры.
+    :param sq: Текущая клетка фигуры.
+    :param occupied: Битборд занятых клеток.
+    :return: Битборд клеток-источников.
+    """
+    empty = ~occupied
+    if piece == KING:
+        return KING_ATTACKS[sq] & empty
+    if piece == KNIGHT:
+        return KNIGHT_ATTACKS[sq] & empty
+    if piece == BISHOP:
+        return bishop_attacks(sq, occupied) & empty
+    if piece == ROOK:
+        return rook_attacks(sq, occupied) & empty
+    if piece == QUEEN:
+        return (rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)) & empty
+    # Пешка: белые ходят вверх (к ряду 0), поэтому пришли с ряда ниже
+    step = 8 if color == WHITE else -8
+    origins = 0
+    one = sq + step
+    if 8 <= one < 56 and not (occupied >> one) & 1:
+        origins |= 1 << one
+        if sq // 8 == (4 if color == WHITE else 3) and not (occupied >> (one + step)) & 1:
+            origins |= 1 << (one + step)
+    return origins
+
+def build_table(signature, tablebases, verbose=True):
+    """
+    Строит таблицу ретроградным анализом и записывает ее в файл.
+    
+    Сначала для каждой позиции считаются допустимые ходы: ходы, меняющие материал (взятия
+    и превращения), оцениваются по подчиненным таблицам, остальные подсчитываются. Затем
+    результаты распространяются назад по «обратным ходам» в порядке возрастания числа
+    полуходов до мата, поэтому каждая позиция получает точную дистанцию до мата.
+    
+    :param signature: Каноническая сигнатура.
+    :param tablebases: Набор таблиц для подчиненных окончаний.
+    :param verbose: Печатать ход построения.
+    """
+    spec = TableSpec(signature)
+    size = spec.size
+    started = time.perf_counter()
+    if verbose:
+        print(f"Построение таблицы {signature}: {size} позиций")
+
+    values = array('b', bytes(size))
+    resolved = bytearray(size)      # 0 — не решена, 1 — решена, 2 — недопустима
+    counts = bytearray(size)        # число еще не опровергнутых тихих ходов
+    exit_losses = bytearray(size)   # наибольшая дистанция проигрыша среди ходов, меняющих материал
+    blocked = bytearray(size)       # есть ход в ничью или в выигрыш, меняющий материал
+    buckets = defaultdict(lambda: array('q'))
+
+    # Позиции перебираются в порядке индексов; между соседними позициями переставляются
+    # только фигуры, сменившие клетку
+    position = Position()
+    placed = None
+    for index, (side, *squares) in enumerate(product(range(2), *spec.domains)):
+        if len(set(squares)) != len(squares):
+            resolved[index] = 2
+            values[index] = ILLEGAL
+            continue
+        if placed is None:
+            for (color, piece), sq in zip(spec.pieces, squares):
+                position.put_piece(color, piece, sq)
+        else:
+            changed = [i for i in range(len(squares)) if squares[i] != placed[i]]
+            for i in changed:
+                position.remove_piece(*spec.pieces[i], placed[i])
+            for i in changed:
+                position.put_piece(*spec.pieces[i], squares[i])
+        placed = squares
+        position.side = side
+        if position.in_check(side ^ 1):
+            resolved[index] = 2
+            values[index] = ILLEGAL
+            continue
+        moves = position.legal_moves()
+        if not moves:
+            if position.in_check(side):
+                buckets[0].append(index * 2)  # Мат
+            else:
+                resolved[index] = 1  # Пат
+            continue
+        quiet = 0
+        best_win = 0
+        worst_loss = 0
+        for move in moves:
+            to_sq = move_to(move)
+            if position.mailbox[to_sq] == EMPTY and not move_promotion(move):
+                quiet += 1
+                continue
+            position.push(move)
+            value = tablebases.probe(position)
+            position.pop()
+            if value is None:
+                raise RuntimeError(f"Нет таблицы для окончания после хода в {signature}")
+            result, plies = decode_value(value)
+            if result < 0:
+                best_win = plies + 1 if not best_win else min(best_win, plies + 1)
+            elif result > 0:
+                worst_loss = max(worst_loss, plies + 1)
+            else:
+                blocked[index] = 1
+        counts[index] = quiet
+        exit_losses[index] = worst_loss
+        if best_win:
+            blocked[index] = 1
+            buckets[best_win].append(index * 2 + 1)
+        elif not quiet and not blocked[index]:
+            buckets[worst_loss].append(index * 2)
+        if verbose and index and index % 1000000 == 0:
+            print(f"  {index}/{size} позиций, {time.perf_counter() - started:.0f} с")
+
+    plies = 0
+    while buckets:
+        bucket = buckets.pop(plies, None)
+        if bucket is not None:
+            for entry in bucket:
+                index, win = entry >> 1, entry & 1
+                if resolved[index]:
+                    continue
+                resolved[index] = 1
+                values[index] = encode_result(win, plies)
+                side, squares = spec.decode(index)
+                mover = side ^ 1
+                # Индекс родителя отличается сменой стороны и клетки одной фигуры
+                base = index + (mover - side) * spec.side_stride
+                occupied = 0
+                for sq in squares:
+                    occupied |= 1 << sq
+                for i, (color, piece) in enumerate(spec.pieces):
+                    if color != mover:
+                        continue
+                    stride = spec.strides[i]
+                    sq = squares[i]
+                    for origin in iter_bits(unmove_origins(piece, color, sq, occupied)):
+                        parent = base + (origin - sq) * stride
+                        if resolved[parent]:
+                            continue
+                        if not win:
+                            buckets[plies + 1].append(parent * 2 + 1)
+                        else:
+                            counts[parent] -= 1
+                            if not counts[parent] and not blocked[parent]:
+                                buckets[max(plies + 1, exit_losses[parent])].append(parent * 2)
+        plies += 1
+
+    os.makedirs(tablebases.directory, exist_ok=True)
+    path = tablebases.path(signature)
+    temporary = f'{path}.{os.getpid()}.tmp'  # Свой файл у каждого процесса построения
+    with open(temporary, 'wb') as f:
+        values.tofile(f)
+    os.replace(temporary, path)
+    if verbose:
+        print(f"Таблица {signature} записана в {path} за {time.perf_counter() - started:.0f} с")
+
+def main():
+    parser = argparse.ArgumentParser(description='Построение эндшпильных таблиц')
+    parser.add_argument('signatures', nargs='+', metavar='СИГНАТУРА', help='например, KPKP')
+    parser.add_argument('--directory', help='каталог таблиц (по умолчанию settings.TABLEBASE_DIR)')
+    parser.add_argument('--background', action='store_true',
+                        help='построение по запросу ИИ: без вывода и с пониженным приоритетом')
+    args = parser.parse_args()
+    if args.background and hasattr(os, 'nice'):
+        os.nice(10)
+    tablebases = Tablebases(args.directory, build_missing=True)
+    for signature in args.signatures:
+        canonical = normalize_signature(signature)
+        if is_trivial_draw(canonical):
+            print(f"{canonical}: все позиции — ничья, таблица не нужна")
+        elif not os.path.exists(tablebases.path(canonical)):
+            build_table(canonical, tablebases, verbose=not args.background)
+    tablebases.close()
+
+if __name__ == '__main__':
+    main()
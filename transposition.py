@@ -0,0 +1,82 @@
+# transposition.py
+
+from array import array
+
+# Типы границ оценки, хранимой в таблице
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+# Размер одной записи в байтах: ключ (8), оценка (8), ход (4), глубина (1), тип границы (1), поколение (1)
+ENTRY_SIZE = 23
+
+class TranspositionTable:
+    """
+    Таблица транспозиций фиксированного размера для поиска ИИ.
+    
+    Записи хранятся в плоских массивах array, поэтому объем памяти ограничен заранее
+    и не растет во время поиска. Индекс записи — ключ Зобриста по модулю числа записей.
+    """
+    def __init__(self, size_mb):
+        """
+        :param size_mb: Максимальный объем таблицы в мегабайтах.
+        """
+        self.size = max(1, int(size_mb * 1024 * 1024) // ENTRY_SIZE)
+        self.generation = 0
+        self.hits = 0
+        self.clear()
+
+    def new_search(self):
+        """
+        Начинает новое поколение записей: записи прошлых поисков заменяются в первую очередь.
+        """
+        self.generation = (self.generation + 1) & 0xFF
+
+    def clear(self):
+        """
+        Очищает таблицу.
+        """
+        self.keys = array('Q', bytes(8 * self.size))
+        self.scores = array('d', bytes(8 * self.size))
+        self.moves = array('i', [-1]) * self.size
+        self.depths = array('b', [-1]) * self.size
+        self.flags = array('B', bytes(self.size))
+        self.generations = array('B', bytes(self.size))
+
+    def probe(self, key):
+        """
+        Ищет запись для позиции.
+        
+        :param key: Ключ Зобриста позиции.
+        :return: Кортеж (глубина, тип границы, оценка, ход) или None, если записи нет.
+        """
+        index = key % self.size
+        if self.depths[index] < 0 or self.keys[index] != key:
+            return None
+        self.hits += 1
+        return self.depths[index], self.flags[index], self.scores[index], self.moves[index]
+
+    def store(self, key, depth, flag, score, move):
+        """
+        Сохраняет результат поиска позиции.
+        
+        Запись заменяется, если она пуста, относится к той же позиции, оставлена
+        предыдущим поиском или была получена на меньшей или равной глубине.
+        
+        :param key: Ключ Зобриста позиции.
+        :param depth: Оставшаяся глубина поиска.
+        :param flag: Тип границы (EXACT, LOWER_BOUND, UPPER_BOUND).
+        :param score: Оценка позиции.
+        :param move: Лучший ход или -1.
+        """
+        index = key % self.size
+        stored_depth = self.depths[index]
+        if (stored_depth >= 0 and self.keys[index] != key and
+                self.generations[index] == self.generation and stored_depth > depth):
+            return
+        if move < 0 and self.keys[index] == key:
+            move = self.moves[index]  # Сохраняем известный лучший ход позиции
+        self.keys[index] = key
+        self.depths[index] = depth
+        self.flags[index] = flag
+        self.scores[index] = score
+        self.moves[index] = move
+        self.generations[index] = self.generation